@@ -37,6 +37,11 @@ class SearchBot:
     def __init__(self):
         self.token = os.getenv('TELEGRAM_BOT_TOKEN')
         self.api_url = os.getenv('SITE_API_URL', 'http://localhost:8000/api/search/')
+        # Ссылки файла сайт получает по требованию в момент нажатия на кнопку
+        self.links_url = os.getenv('SITE_FILE_LINKS_URL', self.api_url.replace('/search/', '/file-links/'))
+        # Внешний адрес /d/ сайта (https://example.com/d/): кнопка скачивания ведет на сайт,
+        # и ссылку на скачивание сайт получает, только если по кнопке действительно нажали
+        self.download_url = os.getenv('SITE_DOWNLOAD_URL', '')
 
         # Получаем ID разрешенных групп из .env
         allowed_groups = os.getenv('ALLOWED_GROUP_IDS', '')
@@ -537,11 +542,11 @@ class SearchBot:
                 return cache_data['results']
 
         session = await self.get_session()
-        search_url = f"{self.api_url}?q={query}"
-        logger.info(f"🌐 Отправляем запрос к API: {search_url}")
+        logger.info(f"🌐 Отправляем запрос к API: {self.api_url} q='{query}'")
 
         try:
-            async with session.get(search_url) as response:
+            # Тот же поисковый движок, что и у сайта; параметры кодирует aiohttp
+            async with session.get(self.api_url, params={'q': query, 'limit': 100}) as response:
                 logger.info(f"🌐 Получен ответ: {response.status}")
 
                 if response.status != 200:
@@ -646,6 +651,15 @@ class SearchBot:
 
             if file_index < len(results):
                 file_info = results[file_index]
+                if file_info.get('id'):
+                    if self.download_url:
+                        links = await self.fetch_file_links(file_info['id'], kind='public')
+                        file_info = {**file_info, **(links or {}),
+                                     'download_link': f"{self.download_url}{file_info['id']}/"}
+                    else:
+                        links = await self.fetch_file_links(file_info['id'])
+                        if links:
+                            file_info = {**file_info, **links}
                 name = html.escape(file_info['name'])
                 path = html.escape(file_info['path'])
 
@@ -676,6 +690,20 @@ class SearchBot:
             logger.error(f"Callback error: {e}")
             await callback_query.answer("❌ Ошибка при обработке запроса")
 
+    async def fetch_file_links(self, file_id, kind=None):
+        """Ссылки файла с сайта: недостающие сайт получает у Яндекс.Диска и сохраняет"""
+        try:
+            session = await self.get_session()
+            params = {'kind': kind} if kind else {}
+            async with session.get(f"{self.links_url}{file_id}/", params=params) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return {field: data[field] for field in ('public_link', 'download_link') if field in data}
+                logger.error(f"❌ Ссылки файла {file_id}: статус {response.status}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения ссылок файла {file_id}: {e}")
+        return None
+
     async def more_callback(self, callback_query: types.CallbackQuery, state: FSMContext):
         """Обработчик кнопки навигации"""
         try:
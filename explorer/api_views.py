@@ -3,7 +3,8 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from .models import FileIndex
 from .utils.yandex_disk import YandexDiskClient
-from .views import SmartSearch
+from .utils.search_engine import format_size, get_search_engine
+from .utils.file_links import LINK_FIELDS, register_click, resolve_links
 import json
 
 
@@ -16,56 +17,33 @@ def api_search(request):
     # Получаем поисковый запрос
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            query = data.get('query', '').strip()
+            params = json.loads(request.body)
+            query = params.get('query', '').strip()
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
     else:
-        query = request.GET.get('q', '').strip()
+        params = request.GET
+        query = params.get('q', '').strip()
 
     if not query:
         return JsonResponse({'error': 'Query parameter "q" is required'}, status=400)
 
-    # Получаем ВСЕ файлы из базы
-    all_files_db = FileIndex.objects.all()
+    try:
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 100))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Parameters "offset" and "limit" must be integers'}, status=400)
 
-    # Применяем умный поиск ко всем файлам
-    scored_results = []
-    yandex_client = YandexDiskClient()
+    # Общий для сайта и API поиск, порог релевантности 10
+    search_result = get_search_engine().search(query, threshold=10, offset=offset, limit=limit)
+
+    # Время этапов в миллисекундах
+    search_result['timings'] = {
+        stage: value if stage in ('candidates_count', 'cache_hit', 'workers') else round(value * 1000, 2)
+        for stage, value in search_result['timings'].items()
+    }
 
-    for file_item in all_files_db:
-        # Вычисляем релевантность с помощью умного поиска
-        relevance = SmartSearch.smart_search(query, file_item.name)
-
-        if relevance > 10:  # Порог релевантности
-            relative_path = yandex_client.get_relative_path(file_item.path)
-            path_parts = relative_path.split('/')
-            display_path = ' / '.join(path_parts[:-1]) if len(path_parts) > 1 else 'Корневая папка'
-
-            scored_results.append({
-                'name': file_item.name,
-                'path': display_path,
-                'full_path': file_item.path,
-                'size': file_item.size,
-                'size_formatted': format_size(file_item.size),
-                'modified': file_item.modified,
-                'download_link': file_item.download_link,
-                'public_link': file_item.public_link,
-                'media_type': file_item.media_type,
-                'relevance': relevance
-            })
-
-    # Сортируем по релевантности (убывание)
-    scored_results.sort(key=lambda x: x['relevance'], reverse=True)
-
-    # Ограничиваем количество результатов
-    final_results = scored_results[:100]
-
-    return JsonResponse({
-        'query': query,
-        'results_count': len(final_results),
-        'results': final_results
-    })
+    return JsonResponse(search_result)
 
 
 @csrf_exempt
@@ -86,15 +64,18 @@ def api_file_info(request, file_path):
     file_index = FileIndex.objects.filter(path=file_path).first()
 
     if file_index:
+        links = resolve_links(file_index)
+        register_click(file_index.pk)
         file_info = {
+            'id': file_index.pk,
             'name': file_index.name,
             'path': file_index.path,
             'size': file_index.size,
             'size_formatted': format_size(file_index.size),
             'modified': file_index.modified,
             'media_type': file_index.media_type,
-            'download_link': file_index.download_link,
-            'public_link': file_index.public_link
+            'download_link': links['download_link'],
+            'public_link': links['public_link']
         }
         return JsonResponse({'file': file_info})
 
@@ -126,16 +107,23 @@ def api_file_info(request, file_path):
     return JsonResponse({'file': file_info})
 
 
-def format_size(size_bytes):
-    """Форматирует размер файла в читаемый вид"""
-    if size_bytes == 0:
-        return "0 Б"
+@csrf_exempt
+@require_http_methods(["GET"])
+def api_file_links(request, file_id):
+    """
+    API для ссылок файла из результатов поиска: недостающие получаются по требованию
+    Пример: GET /api/file-links/42/ или /api/file-links/42/?kind=public - только публичная
+    """
+    kind = request.GET.get('kind')
+    if kind is not None and kind not in LINK_FIELDS:
+        return JsonResponse({'error': 'Parameter "kind" must be "download" or "public"'}, status=400)
 
-    size_names = ["Б", "КБ", "МБ", "ГБ", "ТБ"]
-    i = 0
-    while size_bytes >= 1024 and i < len(size_names) - 1:
-        size_bytes /= 1024.0
-        i += 1
+    file_index = FileIndex.objects.filter(pk=file_id).first()
+    if not file_index:
+        return JsonResponse({'error': 'File not found'}, status=404)
 
-    return f"{size_bytes:.2f} {size_names[i]}"
+    fields = (LINK_FIELDS[kind],) if kind else tuple(LINK_FIELDS.values())
+    links = resolve_links(file_index, fields=fields)
+    register_click(file_id)
 
+    return JsonResponse({'id': file_id, **links})
@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def enable_sqlite_wal(sender, connection, **kwargs):
+    """WAL: поиск и навигация читают прежнее поколение, пока update_file_index пишет новое"""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+
 
 class ExplorerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'explorer'
\ No newline at end of file
+    name = 'explorer'
+
+    def ready(self):
+        connection_created.connect(enable_sqlite_wal, dispatch_uid='explorer_sqlite_wal')
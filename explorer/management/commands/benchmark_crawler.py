@@ -0,0 +1,209 @@
+import asyncio
+import socket
+import threading
+import time
+import tracemalloc
+
+from aiohttp import web
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from explorer.utils.shared_cache import shared_cache
+from explorer.utils.yandex_disk import YandexDiskClient
+
+
+class FakeDiskAPI:
+    """Локальная замена API Яндекс.Диска с синтетическим деревом папок"""
+
+    ROOT = 'Benchmark'
+
+    def __init__(self, depth, fanout, files_per_folder, latency):
+        self.depth = depth
+        self.fanout = fanout
+        self.files_per_folder = files_per_folder
+        self.latency = latency
+        self.requests = 0
+        self.loop = None
+        self.runner = None
+        self.port = None
+
+    def folder_items(self, path):
+        """Содержимое папки: path вида disk:/Benchmark/d0/d3"""
+        level = path.count('/') - 1
+        items = []
+
+        if level < self.depth:
+            for i in range(self.fanout):
+                items.append(self.make_item(f"{path}/d{i}", 'dir'))
+
+        for i in range(self.files_per_folder):
+            # Каждый второй файл уже опубликован - его public_url приходит в листинге
+            items.append(self.make_item(f"{path}/Документ {i} NUOVO Complanar.pdf", 'file', published=i % 2 == 0))
+
+        return items
+
+    @staticmethod
+    def make_item(path, item_type, published=False):
+        name = path.rsplit('/', 1)[-1]
+        item = {
+            'name': name,
+            'path': path,
+            'type': item_type,
+            'created': '2024-01-01T00:00:00+00:00',
+            'modified': '2024-01-02T00:00:00+00:00',
+            'resource_id': f"1:{abs(hash(path)):x}",
+            'revision': 1700000000000000,
+            'comment_ids': {'private_resource': '', 'public_resource': ''},
+            'exif': {},
+        }
+        if item_type == 'file':
+            item.update({
+                'size': 123456,
+                'mime_type': 'application/pdf',
+                'media_type': 'document',
+                'md5': 'd41d8cd98f00b204e9800998ecf8427e',
+                'sha256': 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855',
+                'antivirus_status': 'clean',
+                'file': f"https://downloader.disk.yandex.ru/disk/{name}",
+                'preview': f"https://downloader.disk.yandex.ru/preview/{name}",
+                'sizes': [{'url': f"https://downloader.disk.yandex.ru/preview/{name}", 'name': 'DEFAULT'}],
+            })
+        if published:
+            item['public_key'] = f"key{abs(hash(path)):x}"
+            item['public_url'] = f"https://yadi.sk/d/{item['public_key']}"
+        return item
+
+    @staticmethod
+    def apply_fields(items, fields):
+        """Поддержка параметра fields для _embedded.items.*"""
+        wanted = [field.split('.', 2)[2] for field in fields.split(',') if field.startswith('_embedded.items.')]
+        if not wanted:
+            return items
+        return [{key: item[key] for key in wanted if key in item} for item in items]
+
+    async def handle_resources(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        path = request.query.get('path', '')
+        limit = int(request.query.get('limit', 20))
+        offset = int(request.query.get('offset', 0))
+
+        all_items = self.folder_items(path)
+        items = all_items[offset:offset + limit]
+        if 'fields' in request.query:
+            items = self.apply_fields(items, request.query['fields'])
+
+        return web.json_response({
+            'path': path,
+            'type': 'dir',
+            '_embedded': {'items': items, 'limit': limit, 'offset': offset, 'total': len(all_items), 'path': path},
+        })
+
+    def start(self):
+        """Запускает сервер в отдельном потоке со своим event loop"""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+
+        started = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            app = web.Application()
+            app.router.add_get('/v1/disk/resources', self.handle_resources)
+            self.runner = web.AppRunner(app, access_log=None)
+            self.loop.run_until_complete(self.runner.setup())
+            self.loop.run_until_complete(web.TCPSite(self.runner, '127.0.0.1', self.port).start())
+            started.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        started.wait()
+        return f"http://127.0.0.1:{self.port}/v1/disk/resources"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает потоковый и асинхронный обход Диска на локальном синтетическом API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depth', type=int, default=3, help='Глубина дерева (по умолчанию: 3)')
+        parser.add_argument('--fanout', type=int, default=8, help='Подпапок в папке (по умолчанию: 8)')
+        parser.add_argument('--files', type=int, default=40, help='Файлов в папке (по умолчанию: 40)')
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Задержка ответа API в секундах (по умолчанию: 0.05)')
+        parser.add_argument('--workers', type=int, default=16, help='Параллелизм (по умолчанию: 16)')
+        parser.add_argument('--rate', type=float, default=200,
+                            help='Лимит запросов в секунду (по умолчанию: 200)')
+
+    def handle(self, *args, **options):
+        api = FakeDiskAPI(options['depth'], options['fanout'], options['files'], options['latency'])
+        api_url = api.start()
+
+        self.stdout.write(f'🧪 Синтетический API: {api_url}')
+
+        # Синтетические папки не должны попасть в общий кэш реальных данных
+        shared_alias = shared_cache.alias
+        shared_cache.alias = 'default'
+        try:
+            results = {}
+            for engine in ('threads', 'async'):
+                results[engine] = self.run_engine(api, api_url, engine, options)
+        finally:
+            shared_cache.alias = shared_alias
+            api.stop()
+
+        threads, asynchronous = results['threads'], results['async']
+        if sorted(threads['paths']) != sorted(asynchronous['paths']):
+            self.stdout.write(self.style.ERROR('❌ Списки файлов различаются!'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Списки файлов совпадают: {len(threads['paths'])} файлов"))
+
+        self.stdout.write(f"{'движок':<10}{'время, с':>12}{'файлов/с':>12}{'пик памяти, МБ':>18}{'запросов':>12}")
+        for engine, result in results.items():
+            self.stdout.write(f"{engine:<10}{result['time']:>12.2f}{result['speed']:>12.1f}"
+                              f"{result['peak'] / 1024 / 1024:>18.2f}{result['requests']:>12}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🚀 Ускорение: x{threads['time'] / asynchronous['time']:.2f}, "
+            f"память: x{threads['peak'] / max(asynchronous['peak'], 1):.2f} меньше"
+        ))
+
+    def make_client(self, api_url, options):
+        client = YandexDiskClient()
+        client.api_base_url = api_url
+        client.root_folder = FakeDiskAPI.ROOT
+        client.max_workers = options['workers']
+        client.rate_limit = options['rate']
+        client._min_request_interval = 1 / options['rate']
+        return client
+
+    def run_engine(self, api, api_url, engine, options):
+        """Один прогон на время и отдельный прогон под tracemalloc на пиковую память"""
+        cache.clear()
+        api.requests = 0
+        start_time = time.perf_counter()
+        all_files = self.make_client(api_url, options).get_flat_file_list(engine=engine)
+        elapsed = time.perf_counter() - start_time
+        requests_made = api.requests
+
+        cache.clear()
+        tracemalloc.start()
+        self.make_client(api_url, options).get_flat_file_list(engine=engine)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        cache.clear()
+
+        return {
+            'paths': [file['path'] for file in all_files],
+            'time': elapsed,
+            'speed': len(all_files) / elapsed if elapsed else 0,
+            'peak': peak,
+            'requests': requests_made,
+        }
@@ -0,0 +1,151 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from explorer.utils.fts_index import fill_fts_table, fts_search, score_rows
+from explorer.utils.ranking import rank_top_k
+from explorer.utils.smart_search import SmartSearch
+
+# Слова для синтетических имен: частые рабочие слова и выдуманные артикулы
+COMMON_WORDS = [
+    'каталог', 'прайс', 'лист', 'договор', 'счет', 'фактура', 'отчет', 'акт', 'смета', 'чертеж',
+    'проект', 'фото', 'схема', 'инструкция', 'паспорт', 'сертификат', 'спецификация', 'предложение',
+    'коммерческое', 'накладная', 'презентация', 'монтаж', 'поставка', 'оборудование', 'насос',
+    'клапан', 'фильтр', 'котел', 'радиатор', 'труба', 'catalog', 'price', 'report', 'draft', 'final',
+]
+SYLLABLES = ['ка', 'ро', 'ми', 'те', 'лу', 'на', 'ва', 'зе', 'по', 'ри', 'ко', 'да', 'ни', 'ст', 'ор']
+EXTENSIONS = ['pdf', 'docx', 'xlsx', 'jpg', 'png', 'dwg', 'zip']
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает отбор кандидатов через SQLite FTS5 с полным перебором на синтетических строках'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='*', default=[10000, 100000, 1000000],
+                            help='Размеры синтетического индекса (по умолчанию: 10000 100000 1000000)')
+        parser.add_argument('--queries', nargs='*', help='Запросы (по умолчанию строятся по словарю)')
+        parser.add_argument('--count', type=int, default=10,
+                            help='Сколько запросов построить автоматически (по умолчанию: 10)')
+        parser.add_argument('--threshold', type=float, default=5, help='Порог релевантности (по умолчанию: 5)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора имен')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        vocabulary = COMMON_WORDS + self.make_codes(rnd, 5000)
+        queries = options['queries'] or self.make_queries(rnd, options['count'])
+        self.stdout.write(f'🔍 Запросы: {", ".join(queries)}')
+
+        self.stdout.write(f"{'строк':>10}{'FTS, с':>9}{'МБ':>7}{'перебор, мс':>13}"
+                          f"{'FTS, мс':>10}{'кандидатов':>12}{'полнота':>10}")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for size in options['sizes']:
+                db_path = os.path.join(tmp_dir, f'bench_{size}.sqlite3')
+                self.run_size(db_path, size, vocabulary, rnd, queries, options['threshold'])
+
+    def run_size(self, db_path, size, vocabulary, rnd, queries, threshold):
+        db = sqlite3.connect(db_path)
+        cursor = db.cursor()
+        cursor.execute('CREATE TABLE files (id INTEGER PRIMARY KEY, name TEXT, search_vector TEXT, search_tokens TEXT)')
+        variations_cache = {}
+        cursor.executemany(
+            'INSERT INTO files VALUES (:id, :name, :search_vector, :search_tokens)',
+            (self.make_row(file_id, rnd, vocabulary, variations_cache) for file_id in range(1, size + 1)),
+        )
+        db.commit()
+        table_bytes = os.path.getsize(db_path)
+
+        start_time = time.perf_counter()
+        rows = ((file_id, name, norm, json.loads(tokens))
+                for file_id, name, norm, tokens in db.execute('SELECT * FROM files ORDER BY id'))
+        fill_fts_table(cursor, rows, table='files_fts')
+        db.commit()
+        build_time = time.perf_counter() - start_time
+        fts_bytes = os.path.getsize(db_path) - table_bytes
+
+        scan_time = 0.0
+        fts_time = 0.0
+        candidates = 0
+        found = 0
+        expected_total = 0
+        for query in queries:
+            query_info = SmartSearch.analyze_query(query)
+
+            # Прежний путь: все строки таблицы проходят через Python
+            start_time = time.perf_counter()
+            cursor.execute('SELECT id, name, search_vector, search_tokens FROM files ORDER BY id')
+            expected = rank_top_k(score_rows(query_info, cursor, threshold), 100)
+            scan_time += time.perf_counter() - start_time
+
+            timings = {}
+            start_time = time.perf_counter()
+            results = fts_search(cursor, query_info, threshold=threshold, limit=100,
+                                 table='files_fts', files_table='files', timings=timings)
+            fts_time += time.perf_counter() - start_time
+            candidates += timings.get('candidates_count', 0)
+
+            found += len(set(expected) & set(results))
+            expected_total += len(expected)
+
+        db.close()
+
+        recall = found / expected_total if expected_total else 1.0
+        self.stdout.write(
+            f'{size:>10}{build_time:>9.2f}{fts_bytes / 1024 / 1024:>7.1f}'
+            f'{scan_time / len(queries) * 1000:>13.1f}{fts_time / len(queries) * 1000:>10.1f}'
+            f'{candidates // len(queries):>12}{recall * 100:>9.1f}%'
+        )
+
+    @staticmethod
+    def make_codes(rnd, count):
+        """Выдуманные слова и артикулы: словарь реального Диска в основном из них"""
+        codes = set()
+        while len(codes) < count:
+            word = ''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+            codes.add(word if rnd.random() < 0.7 else f'{word}{rnd.randint(10, 999)}')
+        return sorted(codes)
+
+    @staticmethod
+    def make_row(file_id, rnd, vocabulary, variations_cache):
+        # Частые слова встречаются намного чаще артикулов, как в жизни
+        words = [rnd.choice(COMMON_WORDS) if rnd.random() < 0.5 else rnd.choice(vocabulary)
+                 for _ in range(rnd.randint(2, 5))]
+        if rnd.random() < 0.3:
+            words.append(str(rnd.randint(2015, 2025)))
+        name = f"{' '.join(words)}.{rnd.choice(EXTENSIONS)}"
+
+        name_norm = SmartSearch.normalize_text(name)
+        name_words = name_norm.split()
+        variations = {}
+        for word in name_words:
+            if len(word) > 2:
+                if word not in variations_cache:
+                    variations_cache[word] = SmartSearch.get_word_variations(word)
+                variations[word] = variations_cache[word]
+
+        return {
+            'id': file_id,
+            'name': name,
+            'search_vector': name_norm,
+            'search_tokens': json.dumps({'words': name_words, 'variations': variations}, ensure_ascii=False),
+        }
+
+    @staticmethod
+    def make_queries(rnd, count):
+        """Слова, пары слов и слова с опечаткой"""
+        queries = []
+        for _ in range(count):
+            kind = rnd.random()
+            word = rnd.choice(COMMON_WORDS)
+            if kind < 0.4:
+                queries.append(word)
+            elif kind < 0.7:
+                queries.append(f'{word} {rnd.choice(COMMON_WORDS)}')
+            else:
+                middle = len(word) // 2
+                queries.append(word[:middle - 1] + word[middle] + word[middle - 1] + word[middle + 1:])
+        return queries
@@ -0,0 +1,185 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from explorer.models import FileIndex
+from explorer.utils.file_snapshot import FileSnapshot
+from explorer.utils.parallel_scoring import ScoringPool
+from explorer.utils.ranking import rank_top_k
+from explorer.utils.search_engine import get_search_engine
+from explorer.utils.search_index import get_search_index
+from explorer.utils.smart_search import SmartSearch
+
+
+class Command(BaseCommand):
+    help = 'Измеряет CPU на поиск по текущему FileIndex: кэши SmartSearch, снапшот против ORM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', nargs='*', help='Запросы (по умолчанию строятся по словам индекса)')
+        parser.add_argument('--count', type=int, default=30,
+                            help='Сколько запросов построить автоматически (по умолчанию: 30)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Сколько раз прогнать запросы с теплым кэшем (по умолчанию: 3)')
+        parser.add_argument('--threshold', type=float, default=5, help='Порог релевантности (по умолчанию: 5)')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Сравнить с параллельной оценкой в N процессах (по умолчанию: не сравнивать)')
+
+    def handle(self, *args, **options):
+        search_index = get_search_index()
+        if not len(search_index):
+            raise CommandError('Индекс пуст, сначала выполните update_file_index')
+
+        queries = options['queries'] or self.make_queries(search_index, options['count'])
+        self.stdout.write(f'🔍 {len(queries)} запросов по {len(search_index)} файлам')
+
+        memos = (SmartSearch.SIMILARITY_CACHE, SmartSearch.QUERY_CACHE)
+        sizes = [memo.maxsize for memo in memos]
+
+        try:
+            for memo in memos:
+                memo.maxsize = 0
+            # Прогрев без замера: первый проход не должен включать разовые затраты
+            self.run_queries(search_index, queries, options['threshold'])
+            baseline, expected = self.run_queries(search_index, queries, options['threshold'])
+        finally:
+            for memo, size in zip(memos, sizes):
+                memo.maxsize = size
+                memo.clear()
+
+        cold, results = self.run_queries(search_index, queries, options['threshold'])
+        if results != expected:
+            raise CommandError('Результаты с кэшем отличаются от результатов без кэша')
+
+        warm = 0.0
+        for _ in range(options['repeat']):
+            elapsed, _ = self.run_queries(search_index, queries, options['threshold'])
+            warm += elapsed
+        warm /= max(options['repeat'], 1)
+
+        self.stdout.write(f"{'режим':<16}{'CPU, с':>10}{'мс/запрос':>12}")
+        for title, elapsed in (('без кэша', baseline), ('холодный кэш', cold), ('теплый кэш', warm)):
+            self.stdout.write(f'{title:<16}{elapsed:>10.3f}{elapsed / len(queries) * 1000:>12.2f}')
+
+        for name, stats in SmartSearch.get_cache_stats().items():
+            self.stdout.write(f'🗄️ Кэш {name}: попаданий {stats["hits"]}, промахов {stats["misses"]} '
+                              f'({stats["hit_rate"] * 100:.1f}%), записей {stats["size"]}/{stats["maxsize"]}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'🚀 CPU на поиск: x{baseline / max(cold, 1e-9):.2f} с холодным кэшем, '
+            f'x{baseline / max(warm, 1e-9):.2f} с теплым'
+        ))
+
+        self.compare_snapshot(queries, options['threshold'])
+
+        if options['workers'] > 1:
+            self.compare_parallel(search_index, queries, options['threshold'], options['workers'])
+
+    def compare_snapshot(self, queries, threshold):
+        """Память на файл и время выдачи результатов: снапшот против моделей ORM"""
+        sample = FileIndex.objects.order_by('id')[:5000]
+
+        tracemalloc.start()
+        snapshot = FileSnapshot()
+        for row in sample.values_list(*FileSnapshot.FIELDS):
+            snapshot.append(*row)
+        snapshot_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        instances = list(sample)
+        orm_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        count = max(len(instances), 1)
+        self.stdout.write(f'💾 Память на файл: снапшот {snapshot_bytes / count:.0f} Б, '
+                          f'модель ORM {orm_bytes / count:.0f} Б (по {len(instances)} строкам)')
+        del instances
+
+        engine = get_search_engine()
+        search_index = get_search_index()
+        snapshot_time = 0.0
+        orm_time = 0.0
+        for query in queries:
+            page = search_index.search(query, threshold=threshold, limit=100)
+            file_ids = [file_id for file_id, _ in page]
+
+            start_time = time.perf_counter()
+            for file_id, relevance in page:
+                engine.serialize(search_index.snapshot, file_id, relevance)
+            snapshot_time += time.perf_counter() - start_time
+
+            # Прежний путь: модели ORM для победителей
+            start_time = time.perf_counter()
+            files_by_id = FileIndex.objects.in_bulk(file_ids)
+            for file_id, relevance in page:
+                file_item = files_by_id[file_id]
+                {
+                    'name': file_item.name,
+                    'path': engine.yandex_client.get_relative_path(file_item.path),
+                    'size': file_item.size,
+                    'modified': file_item.modified,
+                    'media_type': file_item.media_type,
+                    'file_type': file_item.file_type,
+                    'relevance': relevance,
+                }
+            orm_time += time.perf_counter() - start_time
+
+        self.stdout.write(f'📦 Выдача 100 результатов: снапшот {snapshot_time / len(queries) * 1000:.2f} мс, '
+                          f'модели ORM {orm_time / len(queries) * 1000:.2f} мс на запрос')
+
+    def compare_parallel(self, search_index, queries, threshold, workers):
+        """Время оценки всех кандидатов: один процесс против пула процессов"""
+        pool = ScoringPool(search_index, workers)
+        try:
+            # Прогрев: процессы стартуют при первой задаче
+            pool.score(SmartSearch.analyze_query(queries[0]), [0], threshold, 100)
+
+            serial_time = 0.0
+            parallel_time = 0.0
+            candidates = 0
+            for query in queries:
+                query_info = SmartSearch.analyze_query(query)
+                positions = search_index._candidates(query_info)
+                candidates += len(positions)
+
+                start_time = time.perf_counter()
+                expected = rank_top_k(search_index._score(query_info, positions, threshold), 100)
+                serial_time += time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                results = pool.score(query_info, positions, threshold, 100)
+                parallel_time += time.perf_counter() - start_time
+
+                if results != expected:
+                    raise CommandError(f'Параллельная оценка отличается от последовательной: {query!r}')
+        finally:
+            pool.close()
+
+        self.stdout.write(
+            f'⚙️ Оценка в среднем {candidates // len(queries)} кандидатов: один процесс '
+            f'{serial_time / len(queries) * 1000:.2f} мс, {workers} процессов '
+            f'{parallel_time / len(queries) * 1000:.2f} мс на запрос'
+        )
+
+    @staticmethod
+    def run_queries(search_index, queries, threshold):
+        """Процессорное время на все запросы и их результаты"""
+        start_time = time.process_time()
+        results = [search_index.search(query, threshold=threshold, limit=100) for query in queries]
+        return time.process_time() - start_time, results
+
+    @staticmethod
+    def make_queries(search_index, count):
+        """Частые слова индекса, их пары и те же слова с опечаткой"""
+        words = sorted(
+            (word for word in search_index.postings if len(word) > 3 and word.isalpha()),
+            key=lambda word: (-len(search_index.postings[word]), word),
+        )[:max(count // 3, 1)]
+
+        queries = list(words)
+        queries += [f'{first} {second}' for first, second in zip(words, words[1:])]
+        # Опечатка: меняем местами две соседние буквы в середине слова
+        queries += [word[:len(word) // 2 - 1] + word[len(word) // 2] + word[len(word) // 2 - 1]
+                    + word[len(word) // 2 + 1:] for word in words]
+        return queries[:count]
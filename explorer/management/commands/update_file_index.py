@@ -1,8 +1,15 @@
-
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.core.cache import cache
-from explorer.models import FileIndex
+from django.db import transaction
+from django.utils import timezone
+from explorer.models import FileIndex, IndexGeneration
 from explorer.utils.yandex_disk import YandexDiskClient
+from explorer.utils.shared_cache import shared_cache
+from explorer.utils.index_pipeline import IndexPipeline
+from explorer.utils.directory_index import parent_of, rebuild_directory_index
+from explorer.utils.file_links import expires_at, is_fresh
+from explorer.utils.fts_index import fts_enabled, rebuild_fts_index
+from explorer.utils.smart_search import SmartSearch
 from explorer.views import FileView
 import time
 
@@ -10,11 +17,20 @@ import time
 class Command(BaseCommand):
     help = 'Обновляет индекс файлов для быстрого поиска'
 
+    # Поля, которые обновляются у изменившихся файлов
+    UPDATE_FIELDS = [
+        'name', 'parent_path', 'public_link', 'public_key', 'download_link', 'download_link_expires', 'size',
+        'modified', 'media_type', 'file_type', 'md5', 'revision', 'search_vector', 'search_tokens', 'updated_at',
+    ]
+
+    # Поля, которые вычисляются без API и дозаполняются у старых строк
+    BACKFILL_FIELDS = ['parent_path', 'search_vector', 'search_tokens']
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--skip-preload',
             action='store_true',
-            help='Пропустить предзагрузку share-ссылок',
+            help='Не запрашивать ссылки на скачивание и публичные ссылки',
         )
         parser.add_argument(
             '--batch-size',
@@ -28,101 +44,349 @@ class Command(BaseCommand):
             default=16,
             help='Количество потоков (по умолчанию: 16)',
         )
+        parser.add_argument(
+            '--link-strategy',
+            choices=['eager', 'lazy', 'folder'],
+            default='eager',
+            help='eager - получать ссылки при обновлении, lazy - только при первом открытии файла, '
+                 'folder - публиковать папки и строить ссылки файлов внутри них (по умолчанию: eager)',
+        )
+        parser.add_argument(
+            '--publish-depth',
+            type=int,
+            default=1,
+            help='Для --link-strategy=folder: глубина публикуемых папок от корня, 0 - весь корень; '
+                 'файлы выше этой глубины публикуются по одному (по умолчанию: 1)',
+        )
+        parser.add_argument(
+            '--download-links',
+            action='store_true',
+            help='Запрашивать и ссылки на скачивание, только с --link-strategy=eager (по умолчанию только '
+                 'публичные: ссылки на скачивание истекают через YANDEX_DOWNLOAD_LINK_TTL и обновляются при выдаче)',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Обновить только новые, измененные и удаленные файлы',
+        )
 
     def handle(self, *args, **options):
         start_time = time.time()
 
+        # lazy и folder ссылки на скачивание не запрашивают - не игнорируем флаг молча
+        if options['download_links'] and options['link_strategy'] != 'eager':
+            raise CommandError(f'--download-links работает только с --link-strategy=eager, '
+                               f'а не {options["link_strategy"]}')
+
         # Настраиваем клиент
         yandex_client = YandexDiskClient()
         yandex_client.max_workers = options['workers']
 
         self.stdout.write(f'🚀 Запуск обновления индекса с {options["workers"]} потоками...')
 
-        # Получаем все файлы
-        self.stdout.write('📁 Получение списка файлов с Яндекс.Диска...')
-        all_files = yandex_client.get_flat_file_list()
+        # Обход, ссылки и подготовка строк идут одновременно
+        self.stdout.write('📁 Обход Яндекс.Диска с параллельным получением ссылок...')
+        if options['incremental']:
+            stats = self.update_incremental(yandex_client, options)
+        else:
+            stats = self.rebuild_full(yandex_client, options)
+
+        total_processed = stats['files']
+        total_folders = stats['folders']
+
+        total_time = time.time() - start_time
+        total_files = FileIndex.objects.count()
+
+        # Финальная статистика
+        files_with_public_links = FileIndex.objects.exclude(public_link__isnull=True).count()
+        files_with_download_links = FileIndex.objects.filter(
+            download_link__isnull=False, download_link_expires__gt=timezone.now()
+        ).count()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ ИНДЕКС ОБНОВЛЕН! {total_files} файлов и {total_folders} папок за {total_time:.2f} сек '
+                f'({total_processed / total_time:.1f} файлов/сек), поколение #{stats["generation"]}'
+            )
+        )
+
+        self.stdout.write(
+            f'⏱️ Этапы: обход {stats["crawl"]:.2f} сек, ссылки {stats["links"]:.2f} сек '
+            f'({stats["links_requested"]} файлов, опубликованных по листингу {stats["public_harvested"]}), запись {stats["write"]:.2f} сек, '
+            f'всего {stats["total"]:.2f} сек'
+        )
 
-        self.stdout.write(f'✅ Получено {len(all_files)} файлов')
+        http_stats = yandex_client.get_stats()
+        self.stdout.write(
+            f'🌐 HTTP: запросов {http_stats["requests"]}, новых соединений {http_stats["connections"]}, '
+            f'переиспользовано {http_stats["reused"]}, повторов {http_stats["retries"]}, '
+            f'ошибок {http_stats["errors"]}, получено {http_stats["bytes"] / 1024 / 1024:.1f} МБ'
+        )
+
+        for namespace, stats in shared_cache.get_stats().items():
+            self.stdout.write(f'🗄️ Кэш {namespace}: попаданий {stats["hits"]}, промахов {stats["misses"]} '
+                              f'({stats["hit_rate"] * 100:.1f}%), записей {stats["sets"]}')
 
-        # МАССОВАЯ ПРЕДЗАГРУЗКА ССЫЛОК
-        if not options['skip_preload']:
-            self.stdout.write('🔗 Многопоточная предзагрузка всех ссылок...')
-            successful_links = yandex_client.mass_preload_all_links(
-                all_files,
-                batch_size=options['batch_size']
+        if total_files:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'🔗 СТАТИСТИКА ССЫЛОК:\n'
+                    f'   • Публичные: {files_with_public_links}/{total_files} '
+                    f'({files_with_public_links / total_files * 100:.1f}%)\n'
+                    f'   • Скачивание (действующие): {files_with_download_links}/{total_files} '
+                    f'({files_with_download_links / total_files * 100:.1f}%)'
+                )
             )
-            self.stdout.write(f'✅ Успешно загружено ссылок: {successful_links}/{len(all_files)}')
-        else:
-            self.stdout.write('⏭️  Пропущена предзагрузка share-ссылок')
-            successful_links = 0
 
-        # Очищаем старый индекс
-        self.stdout.write('🗑️ Очистка старого индекса...')
-        FileIndex.objects.all().delete()
+    def run_pipeline(self, yandex_client, options, on_batch, needs_links=None):
+        """Прогоняет файлы через обход, ссылки и on_batch"""
+        pipeline = IndexPipeline(
+            yandex_client,
+            batch_size=options['batch_size'],
+            fetch_links=not options['skip_preload'] and options['link_strategy'] != 'lazy',
+            needs_links=needs_links,
+            download_links=options['download_links'],
+            folder_depth=options['publish_depth'] if options['link_strategy'] == 'folder' else None,
+        )
+        if options['skip_preload']:
+            self.stdout.write('⏭️  Ссылки не запрашиваются')
+        elif options['link_strategy'] == 'lazy':
+            self.stdout.write('⏭️  Ссылки будут получены при первом открытии файлов (warm_links - заранее)')
+        elif options['link_strategy'] == 'folder':
+            self.stdout.write(f'📂 Публикуются папки глубины {options["publish_depth"]}, '
+                              f'ссылки файлов строятся внутри них')
 
-        # Создаем новый индекс
-        self.stdout.write('💾 Создание индекса в базе данных...')
+        stats = pipeline.run(on_batch)
 
-        batch_size = options['batch_size']
-        total_files = len(all_files)
-        processed = 0
-        file_objects = []
+        # Пустой список почти всегда означает ошибку API - не трогаем индекс
+        if not stats['files']:
+            raise CommandError('Не удалось получить список файлов, индекс оставлен без изменений')
 
-        for i in range(0, total_files, batch_size):
-            batch_files = all_files[i:i + batch_size]
+        self.stdout.write(f'✅ Получено {stats["files"]} файлов')
+        return stats
 
-            # Получаем ссылки для батча (используем оптимизированную версию)
-            file_paths = [{'path': file['path']} for file in batch_files]
-            links_results = yandex_client.batch_get_links_hyper_optimized(file_paths)
-            links_dict = {result['path']: result for result in links_results}
+    def rebuild_full(self, yandex_client, options):
+        """Полная перестройка индекса"""
+        start_time = time.time()
+        file_objects = []
 
+        # id, полученные ранее ссылки и счетчики открытий переживают перестройку:
+        # ссылки /d/<id> и /file/<id>/, уже отправленные ботом, продолжают работать
+        previous = {
+            path: (file_id, public_link, download_link, download_link_expires, click_count)
+            for file_id, path, public_link, download_link, download_link_expires, click_count
+            in FileIndex.objects.values_list(
+                'id', 'path', 'public_link', 'download_link', 'download_link_expires', 'click_count'
+            )
+        }
+
+        def on_batch(batch_files, links_dict):
             for file_item in batch_files:
-                file_links = links_dict.get(file_item['path'], {})
-
-                file_obj = FileIndex(
-                    name=file_item['name'],
-                    path=file_item['path'],
-                    public_link=file_links.get('public_link'),
-                    download_link=file_links.get('download_link'),
-                    size=file_item.get('size', 0),
-                    modified=file_item.get('modified', ''),
-                    media_type=file_item.get('media_type', 'file'),
-                    file_type=FileView.get_file_type(file_item['name'], file_item.get('media_type', 'file')),
-                    search_vector=file_item['name'].lower()
-                )
+                file_obj = self.build_file_object(file_item, links_dict.get(file_item['path'], {}))
+                # pop: путь, встретившийся дважды, не получит тот же id второй раз
+                kept = previous.pop(file_item['path'], None)
+                if kept:
+                    file_obj.id, public_link, download_link, expires, file_obj.click_count = kept
+                    self.keep_previous_links(file_obj, public_link, download_link, expires)
                 file_objects.append(file_obj)
 
-                processed += 1
-                if processed % 200 == 0:
+                if len(file_objects) % 200 == 0:
                     elapsed = time.time() - start_time
-                    speed = processed / elapsed if elapsed > 0 else 0
-                    self.stdout.write(f'📊 Обработано {processed}/{total_files} файлов '
-                                      f'({speed:.1f} файлов/сек)...')
+                    speed = len(file_objects) / elapsed if elapsed > 0 else 0
+                    self.stdout.write(f'📊 Обработано {len(file_objects)} файлов ({speed:.1f} файлов/сек)...')
 
-            # Сохраняем батч в базу
-            FileIndex.objects.bulk_create(file_objects, batch_size=batch_size)
-            file_objects = []  # Очищаем для следующего батча
+        stats = self.run_pipeline(yandex_client, options, on_batch)
 
-        total_time = time.time() - start_time
+        # Полная перестройка заменяет все строки: без части папок она стерла бы их файлы
+        if yandex_client.failed_folders:
+            raise CommandError(
+                f'Не удалось получить листинг {len(yandex_client.failed_folders)} папок '
+                f'({", ".join(sorted(yandex_client.failed_folders)[:5])}), индекс оставлен без изменений'
+            )
 
-        # Финальная статистика
-        files_with_public_links = FileIndex.objects.exclude(public_link__isnull=True).count()
-        files_with_download_links = FileIndex.objects.exclude(download_link__isnull=True).count()
+        def write():
+            FileIndex.objects.all().delete()
+            FileIndex.objects.bulk_create(file_objects, batch_size=options['batch_size'])
 
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'✅ ИНДЕКС ОБНОВЛЕН! {total_files} файлов за {total_time:.2f} сек '
-                f'({total_files / total_time:.1f} файлов/сек)'
-            )
-        )
+        self.stdout.write('🔄 Замена старого индекса...')
+        self.commit_generation(yandex_client, options, stats, 'full', write)
+        return stats
 
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'🔗 СТАТИСТИКА ССЫЛОК:\n'
-                f'   • Публичные: {files_with_public_links}/{total_files} '
-                f'({files_with_public_links / total_files * 100:.1f}%)\n'
-                f'   • Скачивание: {files_with_download_links}/{total_files} '
-                f'({files_with_download_links / total_files * 100:.1f}%)'
+    def update_incremental(self, yandex_client, options):
+        """Инкрементальное обновление: трогаем только изменившиеся строки"""
+        self.stdout.write('🔍 Загрузка текущего индекса для сравнения...')
+
+        existing = {
+            row['path']: row
+            for row in FileIndex.objects.values('id', 'name', 'path', 'parent_path', 'modified', 'size', 'md5', 'revision',
+                                                'search_tokens', 'public_link', 'download_link', 'download_link_expires')
+        }
+
+        def needs_links(file_item):
+            # Ссылки запрашиваем только для новых и изменившихся файлов
+            row = existing.get(file_item['path'])
+            return row is None or self.is_changed(file_item, row)
+
+        new_objects = []
+        changed_objects = []
+        # Неизменившиеся файлы, которые успели опубликовать: ссылка приходит в листинге
+        published_objects = []
+        remote_paths = set()
+
+        # bulk_update не проставляет auto_now, делаем это сами
+        now = timezone.now()
+
+        def on_batch(batch_files, links_dict):
+            for file_item in batch_files:
+                remote_paths.add(file_item['path'])
+                row = existing.get(file_item['path'])
+                if row is None:
+                    new_objects.append(self.build_file_object(file_item, links_dict.get(file_item['path'], {})))
+                elif self.is_changed(file_item, row):
+                    file_obj = self.build_file_object(file_item, links_dict.get(file_item['path'], {}))
+                    self.keep_previous_links(file_obj, row['public_link'], row['download_link'],
+                                             row['download_link_expires'])
+                    file_obj.id = row['id']
+                    file_obj.updated_at = now
+                    changed_objects.append(file_obj)
+                elif file_item.get('public_url') and not row['public_link']:
+                    published_objects.append(FileIndex(
+                        id=row['id'], public_link=file_item['public_url'], public_key=file_item.get('public_key') or '',
+                    ))
+
+        stats = self.run_pipeline(yandex_client, options, on_batch, needs_links=needs_links)
+
+        # Файлы папок с неполученным листингом не считаем удаленными
+        failed_prefixes = tuple(folder.rstrip('/') + '/' for folder in yandex_client.failed_folders)
+        if failed_prefixes:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ Не удалось получить листинг {len(failed_prefixes)} папок, файлы в них не удаляются'
+            ))
+        removed_ids = [
+            row['id'] for path, row in existing.items()
+            if path not in remote_paths and not path.startswith(failed_prefixes)
+        ]
+
+        # Строки из старого индекса без parent_path и токенов дозаполняем без запроса ссылок
+        changed_ids = {file_obj.id for file_obj in changed_objects}
+        backfill_objects = [
+            self.build_backfill_object(row)
+            for path, row in existing.items()
+            if (not row['parent_path'] or not row['search_tokens'])
+            and path in remote_paths and row['id'] not in changed_ids
+        ]
+
+        self.stdout.write(f'📊 Новых: {len(new_objects)}, изменено: {len(changed_objects)}, '
+                          f'удалено: {len(removed_ids)}, без изменений: '
+                          f'{stats["files"] - len(new_objects) - len(changed_objects)}')
+
+        batch_size = options['batch_size']
+
+        def write():
+            for i in range(0, len(removed_ids), batch_size):
+                FileIndex.objects.filter(id__in=removed_ids[i:i + batch_size]).delete()
+            FileIndex.objects.bulk_create(new_objects, batch_size=batch_size)
+            FileIndex.objects.bulk_update(changed_objects, self.UPDATE_FIELDS, batch_size=batch_size)
+            FileIndex.objects.bulk_update(backfill_objects, self.BACKFILL_FIELDS, batch_size=batch_size)
+            FileIndex.objects.bulk_update(published_objects, ['public_link', 'public_key'], batch_size=batch_size)
+
+        has_changes = bool(removed_ids or new_objects or changed_objects or backfill_objects)
+        self.commit_generation(yandex_client, options, stats, 'incremental', write, has_changes=has_changes)
+        return stats
+
+    def commit_generation(self, yandex_client, options, stats, mode, write, has_changes=True):
+        """Записывает файлы, индекс папок и новое поколение одной транзакцией.
+
+        Пока транзакция не завершена, поиск и навигация видят прежнее поколение
+        целиком, после - новое целиком.
+        """
+        write_start = time.time()
+        with transaction.atomic():
+            write()
+
+            # Папки для навигации строим по уже записанным файлам и папкам обхода
+            self.stdout.write('📂 Построение индекса папок...')
+            stats['folders'] = rebuild_directory_index(
+                yandex_client.root_folder, batch_size=options['batch_size'],
+                folders=yandex_client.crawled_folders, failed_folders=yandex_client.failed_folders,
             )
-        )
 
+            build_fts = fts_enabled()
+            generation = IndexGeneration.objects.order_by('-id').first()
+            if has_changes or generation is None or (build_fts and not generation.has_fts):
+                if build_fts:
+                    self.stdout.write('🔎 Построение FTS5 для поиска...')
+                    rebuild_fts_index(batch_size=max(options['batch_size'], 1000))
+                generation = IndexGeneration.objects.create(
+                    mode=mode,
+                    files_count=FileIndex.objects.count(),
+                    folders_count=stats['folders'],
+                    has_fts=build_fts,
+                )
+                # Нужно только действующее поколение; AUTOINCREMENT не выдаст удаленные номера повторно
+                IndexGeneration.objects.filter(pk__lt=generation.pk).delete()
+            else:
+                self.stdout.write('⏭️  Изменений нет, поколение индекса не меняется')
+            stats['generation'] = generation.pk
+        stats['write'] += time.time() - write_start
+
+    @staticmethod
+    def is_changed(file_item, row):
+        """Сравнивает файл с Диска со строкой индекса"""
+        if file_item.get('md5') and row['md5']:
+            if file_item['md5'] != row['md5']:
+                return True
+        if file_item.get('revision') is not None and row['revision'] is not None:
+            if file_item['revision'] != row['revision']:
+                return True
+        return (file_item.get('modified', '') != row['modified']
+                or file_item.get('size', 0) != row['size'])
+
+    @staticmethod
+    def keep_previous_links(file_obj, public_link, download_link, download_link_expires):
+        """Ссылки, которые в этот раз не запрашивались, берем из прежней строки (истекшие - нет)"""
+        file_obj.public_link = file_obj.public_link or public_link
+        if not file_obj.download_link and is_fresh(download_link, download_link_expires):
+            file_obj.download_link = download_link
+            file_obj.download_link_expires = download_link_expires
+
+    @staticmethod
+    def get_parent_path(path):
+        """Папка файла в том же виде, в каком ее ищет веб-интерфейс"""
+        return parent_of(path)
+
+    @classmethod
+    def build_backfill_object(cls, row):
+        """Объект FileIndex только с вычисляемыми полями для bulk_update"""
+        file_obj = FileIndex(id=row['id'], parent_path=cls.get_parent_path(row['path']))
+        file_obj.search_vector, file_obj.search_tokens = cls.build_search_fields(row['name'])
+        return file_obj
+
+    @staticmethod
+    def build_search_fields(name):
+        """Нормализованное имя и токены для поиска: (search_vector, search_tokens)"""
+        name_info = SmartSearch.analyze_name(name)
+        return name_info['norm'], {'words': name_info['words'], 'variations': name_info['variations']}
+
+    @classmethod
+    def build_file_object(cls, file_item, file_links):
+        """Создает объект FileIndex из элемента списка файлов"""
+        search_vector, search_tokens = cls.build_search_fields(file_item['name'])
+        return FileIndex(
+            name=file_item['name'],
+            path=file_item['path'],
+            parent_path=cls.get_parent_path(file_item['path']),
+            # Ссылка из листинга есть у уже опубликованных файлов даже без запроса ссылок
+            public_link=file_links.get('public_link') or file_item.get('public_url'),
+            public_key=file_item.get('public_key') or '',
+            download_link=file_links.get('download_link'),
+            download_link_expires=expires_at(file_links.get('download_link_expires')),
+            size=file_item.get('size', 0),
+            modified=file_item.get('modified', ''),
+            media_type=file_item.get('media_type', 'file'),
+            file_type=FileView.get_file_type(file_item['name'], file_item.get('media_type', 'file')),
+            md5=file_item.get('md5') or '',
+            revision=file_item.get('revision'),
+            search_vector=search_vector,
+            search_tokens=search_tokens
+        )
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from explorer.models import FileIndex
+from explorer.utils.yandex_disk import YandexDiskClient
+
+
+class Command(BaseCommand):
+    help = ('Заранее получает публичные ссылки файлов без ссылок, начиная с самых часто открываемых. '
+            'Ссылки на скачивание истекают, поэтому их обновляет выдача при открытии')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500,
+                            help='Сколько файлов обработать за проход (по умолчанию: 500)')
+        parser.add_argument('--min-clicks', type=int, default=0,
+                            help='Только файлы, открытые не меньше N раз (по умолчанию: 0)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Размер батча (по умолчанию: 50)')
+        parser.add_argument('--workers', type=int, default=16, help='Количество потоков (по умолчанию: 16)')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Повторять проход каждые N секунд (по умолчанию: один проход)')
+
+    def handle(self, *args, **options):
+        yandex_client = YandexDiskClient()
+        yandex_client.max_workers = options['workers']
+
+        while True:
+            warmed = self.warm(yandex_client, options)
+            if not options['interval']:
+                break
+            if not warmed:
+                self.stdout.write(f'💤 Все ссылки на месте, следующий проход через {options["interval"]} сек')
+            time.sleep(options['interval'])
+
+    def warm(self, yandex_client, options):
+        """Один проход по очереди без публичных ссылок; возвращает число файлов, получивших ссылки"""
+        start_time = time.time()
+        rows = list(
+            FileIndex.objects
+            .filter(public_link__isnull=True, click_count__gte=options['min_clicks'])
+            .order_by('-click_count', 'id')
+            .values('id', 'path', 'click_count')[:options['limit']]
+        )
+        if not rows:
+            return 0
+
+        self.stdout.write(f'🔥 Получение ссылок для {len(rows)} файлов '
+                          f'(открытий у первого в очереди: {rows[0]["click_count"]})...')
+
+        warmed = 0
+        batch_size = options['batch_size']
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            results = yandex_client.batch_get_links_hyper_optimized(
+                [{'path': row['path']} for row in batch], download_links=False
+            )
+            links_dict = {result['path']: result for result in results}
+
+            file_objects = [
+                FileIndex(id=row['id'], public_link=links_dict[row['path']]['public_link'])
+                for row in batch
+                if links_dict.get(row['path'], {}).get('public_link')
+            ]
+
+            # bulk_update не трогает updated_at - поколение индекса и кэши поиска не сбрасываются
+            FileIndex.objects.bulk_update(file_objects, ['public_link'], batch_size=batch_size)
+            warmed += len(file_objects)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Ссылки получены для {warmed}/{len(rows)} файлов за {time.time() - start_time:.2f} сек'
+        ))
+        return warmed
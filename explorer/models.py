@@ -6,15 +6,28 @@ class FileIndex(models.Model):
     """Модель для быстрого поиска файлов"""
     name = models.CharField(max_length=500, db_index=True)
     path = models.CharField(max_length=1000, db_index=True)
+    parent_path = models.CharField(max_length=1000, blank=True, db_index=True)
     public_link = models.URLField(max_length=1000, blank=True, null=True)
     download_link = models.URLField(max_length=1000, blank=True, null=True)
+    # Когда истекает подписанная ссылка на скачивание; без даты ссылка считается истекшей
+    download_link_expires = models.DateTimeField(blank=True, null=True)
+    # Ключ публичного ресурса из листинга, если файл опубликован
+    public_key = models.CharField(max_length=200, blank=True)
     size = models.BigIntegerField(default=0)
     modified = models.CharField(max_length=100, blank=True)
     media_type = models.CharField(max_length=100, default='file')
     file_type = models.CharField(max_length=50, default='file')
 
-    # Для полнотекстового поиска
+    # Для инкрементального обновления индекса
+    md5 = models.CharField(max_length=32, blank=True)
+    revision = models.BigIntegerField(blank=True, null=True)
+
+    # Для полнотекстового поиска: нормализованное имя, его слова и их варианты
     search_vector = models.TextField(blank=True)
+    search_tokens = models.JSONField(default=dict, blank=True)
+
+    # Сколько раз файл открывали из поиска, бота или API - по нему warm_links выбирает очередь
+    click_count = models.PositiveIntegerField(default=0, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -30,4 +43,42 @@ class FileIndex(models.Model):
         return self.name
 
 
+class DirectoryIndex(models.Model):
+    """Папки Диска для навигации без обращения к API"""
+    name = models.CharField(max_length=500)
+    path = models.CharField(max_length=1000, unique=True)
+    parent_path = models.CharField(max_length=1000, blank=True, db_index=True)
+    depth = models.PositiveIntegerField(default=0)
+
+    # Прямые потомки
+    file_count = models.PositiveIntegerField(default=0)
+    folder_count = models.PositiveIntegerField(default=0)
+
+    # Вся ветка целиком
+    total_files = models.PositiveIntegerField(default=0)
+    total_size = models.BigIntegerField(default=0)
+    modified = models.CharField(max_length=100, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'directory_index'
 
+    def __str__(self):
+        return self.path
+
+
+class IndexGeneration(models.Model):
+    """Поколение индекса: создается в той же транзакции, что и данные сборки"""
+    mode = models.CharField(max_length=20)
+    files_count = models.PositiveIntegerField(default=0)
+    folders_count = models.PositiveIntegerField(default=0)
+    # Собрана ли для поколения таблица FTS5 (SEARCH_BACKEND = 'fts')
+    has_fts = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'index_generation'
+
+    def __str__(self):
+        return f"#{self.pk} {self.mode}"
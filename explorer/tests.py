@@ -0,0 +1,171 @@
+import random
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from explorer.management.commands.update_file_index import Command
+from explorer.models import FileIndex
+from explorer.utils.file_snapshot import FileSnapshot
+from explorer.utils.fts_index import FTSSearchIndex, rebuild_fts_index
+from explorer.utils.search_index import SearchIndex
+from explorer.utils.smart_search import SmartSearch
+from explorer.utils.yandex_disk import YandexDiskClient
+
+
+class SearchFilesMixin:
+    """Синтетические имена файлов и эталонный полный перебор SmartSearch"""
+
+    VOCABULARY = [
+        'двери', 'дверь', 'дверной', 'распашные', 'раздвижные', 'NUOVO', 'Complanar', 'ROCK', 'инструкция',
+        'монтаж', 'прайс', 'каталог', 'стеновые', 'панели', 'гардероб', 'ALTA', 'PRO', 'fly', 'схема',
+        'сборки', 'кровати', 'Tina', '60', '2024', '(копия)', 'v2', 'стол', 'фасад', 'шпон', 'дуб',
+        'manager', 'report', 'на', 'для', 'и', 'A', 'фрамуга', 'короб', 'коробом',
+    ]
+    NAMES = [
+        'manager report', 'шпон дуб', 'Документ 0 NUOVO Complanar.pdf', 'Каталог дверей NUOVO.pdf',
+    ]
+    QUERIES = [
+        'двери', 'Распашные двери NUOVO', 'nuovo 60', 'дверной короб', 'прайс на столы', 'a', '!!!',
+        'tina', 'схемы сборки кровати', 'pro', 'коробом', 'complanar 60 nuovo', 'каталоги',
+    ]
+    # Опечатки в словах длиной 3, 5, 8 и больше
+    TYPO_QUERIES = ['шпн', 'mnage', 'complanr', 'каталг', 'инстркция монтаж', 'раздвиждные', 'гардроб.pdf']
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(1)
+
+        def typo(word):
+            if len(word) < 4:
+                return word
+            i = rng.randrange(len(word))
+            return word[:i] + rng.choice('абвгxyz') + word[i + 1:]
+
+        names = list(cls.NAMES)
+        for _ in range(1500):
+            words = [rng.choice(cls.VOCABULARY) for _ in range(rng.randint(1, 6))]
+            if rng.random() < 0.3:
+                words = [typo(word) for word in words]
+            names.append(' '.join(words) + rng.choice(['.pdf', '.jpg', '.docx', '']))
+
+        # Часть строк без токенов - как в индексе, собранном до их появления
+        FileIndex.objects.bulk_create([
+            Command.build_file_object({'name': name, 'path': f'disk:/R/{i}/{name}'}, {})
+            if i % 2 else FileIndex(name=name, path=f'disk:/R/{i}/{name}')
+            for i, name in enumerate(names)
+        ])
+
+    @staticmethod
+    def full_scan(query, threshold, limit):
+        results = []
+        for file_id, name in FileIndex.objects.order_by('id').values_list('id', 'name'):
+            relevance = SmartSearch.smart_search(query, name)
+            if relevance > threshold:
+                results.append((file_id, relevance))
+        return sorted(results, key=lambda item: item[1], reverse=True)[:limit]
+
+
+class SearchIndexTests(SearchFilesMixin, TestCase):
+    """Индекс только отбирает кандидатов: выдача должна совпадать с полным перебором"""
+
+    def build_index(self):
+        rows = FileIndex.objects.order_by('id').values_list(*FileSnapshot.FIELDS, 'search_vector', 'search_tokens')
+        return SearchIndex(rows)
+
+    def test_search_matches_full_scan(self):
+        index = self.build_index()
+        for query in self.QUERIES + self.TYPO_QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(index.search(query, 5, limit=100), self.full_scan(query, 5, 100))
+
+    def test_unlimited_search_matches_full_scan(self):
+        index = self.build_index()
+        for threshold in (0, 10):
+            for query in self.QUERIES:
+                with self.subTest(query=query, threshold=threshold):
+                    self.assertEqual(index.search(query, threshold), self.full_scan(query, threshold, None))
+
+    def test_typo_queries_find_files(self):
+        index = self.build_index()
+        for query in self.TYPO_QUERIES:
+            with self.subTest(query=query):
+                self.assertTrue(index.search(query, 5))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 есть только в SQLite')
+class FTSSearchIndexTests(SearchFilesMixin, TestCase):
+    """Отбор FTS5 приближенный (полноту показывает benchmark_fts), но запросы
+    короче триграммы ищутся по search_vector без индекса в памяти"""
+
+    SHORT_QUERIES = ['a', 'ro', '60', 'и', 'v2', '!!!', '-']
+
+    def test_short_queries_match_full_scan(self):
+        rebuild_fts_index()
+        index = FTSSearchIndex(None)
+        with mock.patch('explorer.utils.search_index.SearchIndex', side_effect=AssertionError):
+            for query in self.SHORT_QUERIES:
+                with self.subTest(query=query):
+                    self.assertEqual(index.search(query, 5, limit=100), self.full_scan(query, 5, 100))
+
+
+@mock.patch.dict(settings.YANDEX_DISK_CONFIG, {'ROOT_FOLDER': 'Test'})
+class IncrementalUpdateTests(TestCase):
+    """Папка, листинг которой не получен, не считается пустой"""
+
+    FOLDERS = {'a': 3, 'b': 2}
+
+    @staticmethod
+    def make_files(folders):
+        return [
+            {'name': f'{folder} {i}.pdf', 'path': f'disk:/Test/{folder}/{folder} {i}.pdf', 'size': 1,
+             'modified': '2024-01-01T00:00:00+00:00', 'md5': 'a' * 32, 'revision': 1}
+            for folder, count in folders.items() for i in range(count)
+        ]
+
+    @staticmethod
+    def crawl(files, failed=()):
+        """Обход Диска, который отдает files и не смог прочитать папки failed"""
+        def get_flat_file_list(client, engine=None, on_files=None, use_cache=True):
+            client.failed_folders = {f'disk:/Test/{folder}' for folder in failed}
+            client.crawled_folders = set()
+            if on_files:
+                on_files(files)
+            return files
+        return mock.patch.object(YandexDiskClient, 'get_flat_file_list', get_flat_file_list)
+
+    def update(self, **options):
+        call_command('update_file_index', link_strategy='lazy', stdout=StringIO(), **options)
+
+    def paths(self):
+        return set(FileIndex.objects.values_list('path', flat=True))
+
+    def test_incremental_keeps_files_of_failed_folders(self):
+        files = self.make_files(self.FOLDERS)
+        with self.crawl(files):
+            self.update()
+        self.assertEqual(self.paths(), {f['path'] for f in files})
+
+        # Листинг b не получен: его файлы остаются в индексе
+        with self.crawl(self.make_files({'a': 3}), failed=['b']):
+            self.update(incremental=True)
+        self.assertEqual(self.paths(), {f['path'] for f in files})
+
+        # Удаление в прочитанной папке по-прежнему доходит до индекса
+        with self.crawl(self.make_files({'a': 2, 'b': 2})):
+            self.update(incremental=True)
+        self.assertEqual(self.paths(), {f['path'] for f in self.make_files({'a': 2, 'b': 2})})
+
+    def test_full_rebuild_aborts_on_failed_folders(self):
+        files = self.make_files(self.FOLDERS)
+        with self.crawl(files):
+            self.update()
+
+        with self.crawl(self.make_files({'a': 3}), failed=['b']):
+            with self.assertRaises(CommandError):
+                self.update()
+        self.assertEqual(self.paths(), {f['path'] for f in files})
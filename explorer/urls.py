@@ -7,8 +7,11 @@ urlpatterns = [
     path('folder/<path:path>/', views.index, name='folder'),
     path('search/', views.search, name='search'),
     path('content/', views.content_page, name='content'),
+    path('file/<int:file_id>/<str:kind>/', views.file_link, name='file_link'),
+    path('d/<int:file_id>/', views.download, name='download'),
 
     # API endpoints
     path('api/search/', api_views.api_search, name='api_search'),
     path('api/file-info/<path:file_path>/', api_views.api_file_info, name='api_file_info'),
+    path('api/file-links/<int:file_id>/', api_views.api_file_links, name='api_file_links'),
 ]
\ No newline at end of file
@@ -0,0 +1,181 @@
+import asyncio
+import time
+
+import aiohttp
+
+
+class TokenBucket:
+    """Асинхронный token bucket: rate запросов в секунду, всплеск до capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncDiskCrawler:
+    """Асинхронный обход папок Яндекс.Диска через одну aiohttp-сессию"""
+
+    # Запрашиваем только поля, которые нужны для индекса
+    LISTING_FIELDS = ','.join([
+        '_embedded.total',
+        '_embedded.items.name',
+        '_embedded.items.path',
+        '_embedded.items.type',
+        '_embedded.items.size',
+        '_embedded.items.modified',
+        '_embedded.items.media_type',
+        '_embedded.items.md5',
+        '_embedded.items.revision',
+        # У уже опубликованных файлов ссылка приходит прямо в листинге
+        '_embedded.items.public_url',
+        '_embedded.items.public_key',
+    ])
+
+    def __init__(self, client, concurrency=None, rate=None, max_retries=3):
+        self.client = client
+        self.concurrency = concurrency or client.max_workers
+        self.bucket = TokenBucket(rate or client.rate_limit, capacity=self.concurrency)
+        self.max_retries = max_retries
+        self.requests_made = 0
+
+    async def fetch_page(self, session, path, offset=0):
+        """Одна страница папки с учетом rate limit и Retry-After: (items, total), (None, None) - ошибка"""
+        params = {
+            'path': path if path.startswith('disk:/') else f"disk:/{path}",
+            'limit': self.client.page_size,
+            'offset': offset,
+            'fields': self.LISTING_FIELDS,
+        }
+
+        for attempt in range(self.max_retries):
+            await self.bucket.acquire()
+            self.requests_made += 1
+
+            try:
+                async with session.get(self.client.api_base_url, params=params) as response:
+                    if response.status == 200:
+                        embedded = (await response.json()).get('_embedded', {})
+                        return embedded.get('items', []), embedded.get('total')
+
+                    if response.status == 404:
+                        return [], 0
+
+                    if response.status == 429 or response.status >= 500:
+                        retry_after = response.headers.get('Retry-After')
+                        delay = float(retry_after) if retry_after and retry_after.isdigit() else 0.5 * 2 ** attempt
+                        print(f"⚠️ HTTP {response.status} for '{path}', retry in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+
+                    return None, None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"❌ API Request error for '{path}': {e}")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+        return None, None
+
+    async def fetch_folder(self, session, path):
+        """Все элементы папки: первая страница, затем остальные параллельно"""
+        items, total = await self.fetch_page(session, path)
+        page_size = self.client.page_size
+
+        if items is None:
+            # Пустой список неотличим от пустой папки - запоминаем, что листинг не получен
+            self.client.failed_folders.add(self.client._full_disk_path(path))
+            return []
+
+        if total is None:
+            offset = len(items)
+            while offset and offset % page_size == 0:
+                page, _ = await self.fetch_page(session, path, offset)
+                if page is None:
+                    self.client.failed_folders.add(self.client._full_disk_path(path))
+                if not page:
+                    break
+                items.extend(page)
+                offset += len(page)
+        elif total > len(items):
+            pages = await asyncio.gather(*[
+                self.fetch_page(session, path, offset)
+                for offset in range(len(items), total, page_size)
+            ])
+            for page, _ in pages:
+                if page is None:
+                    self.client.failed_folders.add(self.client._full_disk_path(path))
+                items.extend(page or [])
+
+        return items
+
+    async def crawl(self, on_files=None):
+        """Обходит дерево папок и возвращает плоский список файлов"""
+        all_files = []
+        queue = asyncio.Queue()
+        processed_folders = set()
+        # Ошибка on_files: следующий этап упал, дообходить Диск незачем
+        callback_errors = []
+
+        queue.put_nowait(self.client.root_folder)
+
+        async def worker(session):
+            while True:
+                folder_path = await queue.get()
+                try:
+                    if callback_errors or folder_path in processed_folders:
+                        continue
+                    processed_folders.add(folder_path)
+
+                    folder_files = []
+                    for item in await self.fetch_folder(session, folder_path):
+                        if item['type'] == 'file':
+                            folder_files.append(self.client.make_file_record(item))
+                        elif item['type'] == 'dir':
+                            self.client.crawled_folders.add(item['path'])
+                            queue.put_nowait(item['path'])
+
+                    all_files.extend(folder_files)
+                    if on_files and folder_files:
+                        # on_files может ждать места в очереди - не блокируем event loop
+                        try:
+                            await asyncio.to_thread(on_files, folder_files)
+                        except Exception as e:
+                            callback_errors.append(e)
+                except Exception as e:
+                    self.client.failed_folders.add(self.client._full_disk_path(folder_path))
+                    print(f"❌ Error processing folder {folder_path}: {e}")
+                finally:
+                    queue.task_done()
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.client.request_timeout)
+
+        async with aiohttp.ClientSession(headers=self.client.headers, connector=connector,
+                                         timeout=timeout) as session:
+            workers = [asyncio.create_task(worker(session)) for _ in range(self.concurrency)]
+            await queue.join()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        if callback_errors:
+            raise callback_errors[0]
+        return all_files
+
+    def run(self, on_files=None):
+        """Синхронная обертка для вызова из Django и management-команд"""
+        return asyncio.run(self.crawl(on_files))
@@ -0,0 +1,27 @@
+import hashlib
+import re
+import unicodedata
+
+# Меняется при изменении формата значений в кэше - старые записи просто перестают читаться
+CACHE_SCHEMA_VERSION = 2
+
+
+def normalize_path(path):
+    """Приводит путь к одному виду: NFC, disk:/ в начале, без двойных и конечных слэшей"""
+    path = unicodedata.normalize('NFC', str(path or '').strip())
+    if path.startswith('disk:'):
+        path = path[len('disk:'):]
+    path = re.sub(r'/{2,}', '/', '/' + path.lstrip('/')).rstrip('/')
+    return f"disk:{path or '/'}"
+
+
+def make_key(namespace, *parts):
+    """Стабильный ключ кэша: одинаковый во всех процессах и после перезапуска"""
+    raw = '\x00'.join(str(part) for part in parts)
+    digest = hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+    return f"v{CACHE_SCHEMA_VERSION}:{namespace}:{digest}"
+
+
+def path_key(namespace, path):
+    """Ключ для значения, привязанного к пути на Диске"""
+    return make_key(namespace, normalize_path(path))
@@ -0,0 +1,94 @@
+import time
+
+from django.db import transaction
+
+from explorer.models import DirectoryIndex, FileIndex
+from explorer.utils.cache_keys import normalize_path
+
+
+def parent_of(path):
+    """Родительская папка в нормализованном виде"""
+    return normalize_path(normalize_path(path).rsplit('/', 1)[0])
+
+
+def build_directories(files, root_folder, folders=()):
+    """Строит папки по плоскому списку файлов (path, size, modified).
+
+    folders - пути папок, найденных обходом: без них в индекс попали бы
+    только папки, в ветке которых есть хотя бы один файл.
+    """
+    root = normalize_path(root_folder)
+    directories = {}
+
+    def get_directory(path):
+        directory = directories.get(path)
+        if directory is None:
+            directory = directories[path] = DirectoryIndex(
+                name=path.rsplit('/', 1)[-1],
+                path=path,
+                parent_path=parent_of(path) if path != root else '',
+                depth=path[len(root):].count('/'),
+            )
+        return directory
+
+    get_directory(root)
+
+    # Прямые файлы каждой папки
+    for path, size, modified in files:
+        parent = parent_of(path)
+        if parent != root and not parent.startswith(root + '/'):
+            continue
+        directory = get_directory(parent)
+        directory.file_count += 1
+        directory.total_files += 1
+        directory.total_size += size or 0
+        directory.modified = max(directory.modified, modified or '')
+
+    # Папки без файлов в ветке
+    for path in folders:
+        path = normalize_path(path)
+        if path.startswith(root + '/'):
+            get_directory(path)
+
+    # Промежуточные папки без собственных файлов
+    for path in list(directories):
+        while path != root:
+            path = parent_of(path)
+            if path in directories:
+                break
+            get_directory(path)
+
+    # Поднимаем итоги снизу вверх
+    for directory in sorted(directories.values(), key=lambda item: item.depth, reverse=True):
+        if not directory.parent_path:
+            continue
+        parent = directories[directory.parent_path]
+        parent.folder_count += 1
+        parent.total_files += directory.total_files
+        parent.total_size += directory.total_size
+        parent.modified = max(parent.modified, directory.modified)
+
+    return list(directories.values())
+
+
+def rebuild_directory_index(root_folder, batch_size=1000, folders=(), failed_folders=()):
+    """Пересобирает таблицу папок из FileIndex и папок обхода одной транзакцией.
+
+    Вложенные папки из failed_folders (листинг не получен) берутся из прежнего индекса.
+    """
+    start_time = time.time()
+    folders = set(folders)
+    for failed in failed_folders:
+        folders.update(DirectoryIndex.objects.filter(
+            path__startswith=normalize_path(failed) + '/'
+        ).values_list('path', flat=True))
+
+    files = FileIndex.objects.values_list('path', 'size', 'modified').iterator(chunk_size=5000)
+    directories = build_directories(files, root_folder, folders)
+
+    with transaction.atomic():
+        DirectoryIndex.objects.all().delete()
+        DirectoryIndex.objects.bulk_create(directories, batch_size=batch_size)
+
+    print(f"✅ Directory index built: {len(directories)} folders in {time.time() - start_time:.2f}s")
+    return len(directories)
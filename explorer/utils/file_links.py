@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from explorer.models import FileIndex
+from explorer.utils.index_generation import get_active_generation
+from explorer.utils.memo import LRUMemo
+from explorer.utils.search_engine import get_search_engine
+
+# Поле FileIndex для каждого вида ссылки
+LINK_FIELDS = {'download': 'download_link', 'public': 'public_link'}
+
+# Ссылку, которая истечет раньше чем через столько секунд, уже не отдаем
+EXPIRY_MARGIN = timedelta(seconds=60)
+
+# Горячий кэш /d/<id>: повторные клики по популярным файлам не читают строку индекса и не ходят в API.
+# Ключ содержит поколение: файл, удаленный при обновлении индекса, из кэша не отдается
+_HOT_DOWNLOADS = LRUMemo(getattr(settings, 'DOWNLOAD_HOT_CACHE_SIZE', 512), 'downloads')
+
+
+def expires_at(timestamp):
+    """unix time из кэша клиента -> дата для FileIndex.download_link_expires"""
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc) if timestamp else None
+
+
+def is_fresh(download_link, expires):
+    """Ссылку на скачивание еще можно отдать пользователю"""
+    return bool(download_link) and expires is not None and expires - timezone.now() > EXPIRY_MARGIN
+
+
+def resolve_links(file_index, yandex_client=None, fields=tuple(LINK_FIELDS.values())):
+    """Ссылки файла из fields; недостающие и истекшие запрашиваются у API и сохраняются в FileIndex"""
+    links = {field: getattr(file_index, field) for field in fields}
+    download_fresh = is_fresh(file_index.download_link, file_index.download_link_expires)
+    need_download = 'download_link' in links and not download_fresh
+    need_public = 'public_link' in links and not links['public_link']
+    if not need_download and not need_public:
+        return links
+
+    # Клиент поиска живет весь процесс - не создаем новый на каждый клик
+    client = yandex_client or get_search_engine().yandex_client
+    resolved = {}
+    if need_download:
+        download_link, expires = client.get_download_link_entry(file_index.path)
+        links['download_link'] = download_link
+        if download_link:
+            resolved.update(download_link=download_link, download_link_expires=expires_at(expires))
+    if need_public:
+        links['public_link'] = client.get_public_share_link(file_index.path)
+        if links['public_link']:
+            resolved['public_link'] = links['public_link']
+
+    if resolved:
+        # update() не трогает updated_at, поэтому поколение и кэши поиска остаются прежними
+        FileIndex.objects.filter(pk=file_index.pk).update(**resolved)
+        for field, value in resolved.items():
+            setattr(file_index, field, value)
+
+    return links
+
+
+def get_download_link(file_id, yandex_client=None):
+    """Действующая ссылка на скачивание по id файла или None, если файла нет или API не отдал ссылку"""
+    key = (get_active_generation(), file_id)
+    entry = _HOT_DOWNLOADS.get(key)
+    if entry and is_fresh(*entry):
+        return entry[0]
+
+    file_index = FileIndex.objects.filter(pk=file_id).only(
+        'path', 'download_link', 'download_link_expires'
+    ).first()
+    if file_index is None:
+        return None
+
+    link = resolve_links(file_index, yandex_client, fields=('download_link',))['download_link']
+    if link:
+        _HOT_DOWNLOADS.set(key, (link, file_index.download_link_expires))
+    return link
+
+
+def register_click(file_id):
+    """Учитывает открытие файла: по счетчику warm_links выбирает, чьи ссылки получать первыми"""
+    FileIndex.objects.filter(pk=file_id).update(click_count=F('click_count') + 1)
@@ -0,0 +1,47 @@
+import sys
+from array import array
+from bisect import bisect_left
+
+
+class FileSnapshot:
+    """Колонки FileIndex, нужные поиску, в параллельных массивах без моделей ORM.
+
+    Строка определяется позицией: позиции идут по возрастанию id, поэтому
+    порядок позиций совпадает с порядком полного перебора таблицы.
+    """
+
+    __slots__ = ('ids', 'names', 'paths', 'sizes', 'modified', 'media_types', 'file_types')
+
+    # Колонки FileIndex в порядке аргументов append
+    FIELDS = ('id', 'name', 'path', 'size', 'modified', 'media_type', 'file_type')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.sizes = array('q')
+        self.names = []
+        self.paths = []
+        self.modified = []
+        self.media_types = []
+        self.file_types = []
+
+    def append(self, file_id, name, path, size, modified, media_type, file_type):
+        """Добавляет строку и возвращает ее позицию"""
+        self.ids.append(file_id)
+        self.sizes.append(size or 0)
+        self.names.append(name)
+        self.paths.append(path)
+        self.modified.append(modified)
+        # Типов всего несколько десятков - храним по одной копии строки
+        self.media_types.append(sys.intern(media_type))
+        self.file_types.append(sys.intern(file_type))
+        return len(self.ids) - 1
+
+    def position(self, file_id):
+        """Позиция строки по id или None"""
+        pos = bisect_left(self.ids, file_id)
+        if pos < len(self.ids) and self.ids[pos] == file_id:
+            return pos
+        return None
+
+    def __len__(self):
+        return len(self.ids)
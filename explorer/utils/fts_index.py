@@ -0,0 +1,192 @@
+import json
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from explorer.models import FileIndex, IndexGeneration
+from explorer.utils.file_snapshot import FileSnapshot
+from explorer.utils.fuzzy import search_radius
+from explorer.utils.ranking import rank_top_k
+from explorer.utils.smart_search import SmartSearch
+
+FTS_TABLE = 'file_index_fts'
+
+# SQL общий для Django и чистого sqlite3 (benchmark_fts), поэтому параметры именованные
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE {table} USING fts5("
+    "name_norm, variations, content='', tokenize='trigram')"
+)
+INSERT_SQL = "INSERT INTO {table}(rowid, name_norm, variations) VALUES (:id, :name_norm, :variations)"
+SEARCH_SQL = (
+    "SELECT f.id, f.name, f.search_vector, f.search_tokens FROM {table} "
+    "JOIN {files} f ON f.id = {table}.rowid WHERE {table} MATCH :match ORDER BY f.id"
+)
+# Запрос короче триграммы находит только имена, в которые входит целиком;
+# строки старого индекса без search_vector оцениваются по имени
+SHORT_SEARCH_SQL = (
+    "SELECT id, name, search_vector, search_tokens FROM {files} "
+    "WHERE search_vector = '' OR instr(search_vector, :fragment) > 0 ORDER BY id"
+)
+
+
+def fts_enabled():
+    """Включен ли отбор кандидатов через FTS5"""
+    return getattr(settings, 'SEARCH_BACKEND', 'memory') == 'fts' and connection.vendor == 'sqlite'
+
+
+def fts_documents(rows):
+    """(id, name, search_vector, search_tokens) -> строки FTS: имя целиком и варианты слов"""
+    for file_id, name, search_vector, search_tokens in rows:
+        name_norm, words, variations = SmartSearch.prepared_name(name, search_vector, search_tokens)
+        variants = sorted({variant for word in words if len(word) > 2 for variant in variations[word]})
+        yield {'id': file_id, 'name_norm': name_norm, 'variations': ' '.join(variants)}
+
+
+def fill_fts_table(cursor, rows, table=FTS_TABLE, batch_size=5000):
+    """Пересоздает таблицу FTS по строкам FileIndex и возвращает число файлов"""
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(CREATE_SQL.format(table=table))
+
+    insert_sql = INSERT_SQL.format(table=table)
+    count = 0
+    batch = []
+    for document in fts_documents(rows):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            cursor.executemany(insert_sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(insert_sql, batch)
+        count += len(batch)
+    return count
+
+
+def rebuild_fts_index(batch_size=5000):
+    """Перестраивает FTS5 по FileIndex в текущей транзакции"""
+    start_time = time.time()
+    rows = FileIndex.objects.order_by('id').values_list(
+        'id', 'name', 'search_vector', 'search_tokens'
+    ).iterator(chunk_size=batch_size)
+
+    with connection.cursor() as cursor:
+        count = fill_fts_table(cursor, rows, batch_size=batch_size)
+
+    print(f"✅ FTS index built: {count} files in {time.time() - start_time:.2f}s")
+    return count
+
+
+def fts_phrase(column, text):
+    escaped = text.replace('"', '""')
+    return f'{column} : "{escaped}"'
+
+
+def fts_match(query_info):
+    """Выражение MATCH для отбора кандидатов или None, если FTS5 их не отберет.
+
+    Триграммный токенизатор ищет подстроки не короче 3 символов: запрос
+    целиком в имени, вариант слова запроса в вариантах слов имени и, для
+    опечаток, куски слова запроса - слово с d правками сохраняет хотя бы один
+    из d + 1 кусков. Если куски короче триграммы, берем триграммы слова.
+    Отбор приближенный (полноту показывает benchmark_fts), рейтинг - точный.
+    """
+    query_norm = query_info['norm']
+    if len(query_norm) < 3:
+        return None
+
+    terms = {fts_phrase('name_norm', query_norm)}
+    for q_word in query_info['words']:
+        terms.update(
+            fts_phrase('variations', variation)
+            for variation in query_info['variations'][q_word] if len(variation) >= 3
+        )
+
+        # Опечатки SmartSearch сравнивает без расширения
+        stem = SmartSearch.strip_extension(q_word)
+        pieces = search_radius(len(stem)) + 1
+        size = len(stem) // pieces
+        if size >= 3:
+            for i in range(pieces):
+                end = len(stem) if i == pieces - 1 else (i + 1) * size
+                terms.add(fts_phrase('name_norm', stem[i * size:end]))
+        else:
+            # Куски короче триграммы: берем все триграммы слова
+            terms.update(fts_phrase('name_norm', stem[i:i + 3]) for i in range(len(stem) - 2))
+
+    return ' OR '.join(sorted(terms))
+
+
+def score_rows(query_info, rows, threshold):
+    """Оценивает строки (id, name, search_vector, search_tokens): (id, relevance) выше порога"""
+    for file_id, name, search_vector, search_tokens in rows:
+        if not name:
+            continue
+        if isinstance(search_tokens, str):
+            search_tokens = json.loads(search_tokens)
+
+        name_norm, words, variations = SmartSearch.prepared_name(name, search_vector, search_tokens)
+        file_words = tuple(word for word in words if len(word) > 2)
+        relevance = SmartSearch.score_prepared(query_info, name_norm, file_words, variations)
+        if relevance > threshold:
+            yield file_id, relevance
+
+
+def fts_search(cursor, query_info, threshold=0, limit=None, table=FTS_TABLE, files_table='file_index',
+               timings=None):
+    """Кандидаты из FTS5 с переоценкой SmartSearch: [(id, relevance)].
+
+    Запросы короче триграммы FTS5 не отберет - их кандидатов ищет instr по search_vector.
+    """
+    match = fts_match(query_info)
+
+    start_time = time.perf_counter()
+    if match is None:
+        cursor.execute(SHORT_SEARCH_SQL.format(files=files_table), {'fragment': query_info['norm']})
+    else:
+        cursor.execute(SEARCH_SQL.format(table=table, files=files_table), {'match': match})
+    rows = cursor.fetchall()
+    candidates_time = time.perf_counter()
+
+    # Строки идут по возрастанию id - равные рейтинги в том же порядке, что и при полном переборе
+    scored = score_rows(query_info, rows, threshold)
+    if limit:
+        results = rank_top_k(scored, limit)
+    else:
+        results = sorted(scored, key=lambda item: item[1], reverse=True)
+
+    if timings is not None:
+        timings['candidates'] = candidates_time - start_time
+        timings['scoring'] = time.perf_counter() - candidates_time
+        timings['candidates_count'] = len(rows)
+    return results
+
+
+def fts_generation():
+    """Действующее поколение индекса, если для него собрана таблица FTS5, иначе None"""
+    generation = IndexGeneration.objects.order_by('-id').values_list('id', 'has_fts').first()
+    return generation[0] if generation and generation[1] else None
+
+
+class FTSSearchIndex:
+    """Поиск с отбором кандидатов в SQLite FTS5; интерфейс как у SearchIndex"""
+
+    def __init__(self, generation):
+        # Отпечаток как у get_index_signature: поколение, проверенное до запроса к FTS5
+        self.signature = ('generation', generation)
+
+    def search(self, query, threshold=0, limit=None, timings=None):
+        if not query:
+            return []
+
+        query_info = SmartSearch.analyze_query(query)
+        with connection.cursor() as cursor:
+            return fts_search(cursor, query_info, threshold=threshold, limit=limit, timings=timings)
+
+    @staticmethod
+    def page_snapshot(file_ids):
+        """Снапшот только для файлов страницы"""
+        snapshot = FileSnapshot()
+        for row in FileIndex.objects.filter(id__in=file_ids).order_by('id').values_list(*FileSnapshot.FIELDS):
+            snapshot.append(*row)
+        return snapshot
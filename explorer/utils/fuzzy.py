@@ -0,0 +1,139 @@
+from collections import defaultdict
+
+
+def levenshtein(a, b, max_distance=None):
+    """Расстояние Левенштейна с ранним выходом.
+
+    Если расстояние заведомо больше max_distance, сразу возвращает max_distance + 1.
+    """
+    if a == b:
+        return 0
+
+    if len(a) > len(b):
+        a, b = b, a
+
+    if max_distance is not None and len(b) - len(a) > max_distance:
+        return max_distance + 1
+    if not a:
+        return len(b)
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            value = previous[j - 1] if char_a == char_b else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            current.append(value)
+            if value < row_min:
+                row_min = value
+
+        # Значения в следующих строках не бывают меньше минимума текущей
+        if max_distance is not None and row_min > max_distance:
+            return max_distance + 1
+        previous = current
+
+    distance = previous[-1]
+    if max_distance is not None and distance > max_distance:
+        return max_distance + 1
+    return distance
+
+
+def max_typos(length):
+    """Сколько правок допускает слово длины length, чтобы похожесть была больше 0.7"""
+    return max((3 * length - 1) // 10, 0)
+
+
+def common_length(a, b):
+    """Длина наибольшей общей подпоследовательности"""
+    previous = [0] * (len(b) + 1)
+    for char_a in a:
+        current = [0]
+        for j, char_b in enumerate(b):
+            current.append(previous[j] + 1 if char_a == char_b else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def similarity(a, b):
+    """Похожесть слов с опечатками: больше 0.7 или 0.
+
+    Считается как SequenceMatcher.ratio() (2 * общая подпоследовательность /
+    сумма длин), чтобы пороги 0.7/0.8/0.9 в SmartSearch сохранили смысл, но
+    только для слов не дальше max_typos правок - их находит FuzzyIndex.
+    """
+    length = max(len(a), len(b))
+    if not length:
+        return 0
+
+    limit = max_typos(length)
+    if levenshtein(a, b, limit) > limit:
+        return 0
+
+    ratio = 2 * common_length(a, b) / (len(a) + len(b))
+    return ratio if ratio > 0.7 else 0
+
+
+def search_radius(length):
+    """Радиус поиска для слова длины length: наибольшее r, при котором
+    слово длины length + r еще допускает r правок"""
+    radius = 0
+    while max_typos(length + radius + 1) >= radius + 1:
+        radius += 1
+    return radius
+
+
+class FuzzyIndex:
+    """Индекс словаря для поиска слов в пределах заданного числа правок.
+
+    Принцип Дирихле: если разбить слово на r + 1 кусков, то r правок не заденут
+    хотя бы один кусок, и в похожем слове он стоит со сдвигом не больше r.
+    Кандидатов дают пересечения множеств «буква на позиции», точное
+    расстояние считается только для них и с ранним выходом.
+    """
+
+    def __init__(self, words=()):
+        # (позиция, буква) -> слова словаря
+        self.positions = defaultdict(set)
+        self.words = set()
+        for word in words:
+            if word not in self.words:
+                self.words.add(word)
+                for i, char in enumerate(word):
+                    self.positions[(i, char)].add(word)
+
+    def _words_with_chunk(self, chunk, start):
+        """Слова, в которых chunk стоит с позиции start"""
+        sets = [self.positions.get((start + i, char)) for i, char in enumerate(chunk)]
+        if not all(sets):
+            return ()
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def search(self, word, radius):
+        """Слова словаря на расстоянии не больше radius: [(слово, расстояние)]"""
+        pieces = radius + 1
+        if len(word) < pieces:
+            # Кусков не хватает - фильтр ничего не отсекает
+            candidates = self.words
+        else:
+            candidates = set()
+            size = len(word) // pieces
+            for i in range(pieces):
+                start = i * size
+                chunk = word[start:] if i == pieces - 1 else word[start:start + size]
+                for shift in range(max(-radius, -start), radius + 1):
+                    candidates.update(self._words_with_chunk(chunk, start + shift))
+
+        found = []
+        for candidate in candidates:
+            distance = levenshtein(word, candidate, radius)
+            if distance <= radius:
+                found.append((candidate, distance))
+        return found
+
+    def __len__(self):
+        return len(self.words)
@@ -0,0 +1,6 @@
+from explorer.models import IndexGeneration
+
+
+def get_active_generation():
+    """Номер действующего поколения индекса или None, если индекс еще не собирался"""
+    return IndexGeneration.objects.order_by('-id').values_list('id', flat=True).first()
@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    """Другой этап упал: текущий этап прекращает работу, не дожидаясь места в очереди"""
+
+
+class IndexPipeline:
+    """Однопроходное обновление индекса: обход -> ссылки -> запись.
+
+    Этапы работают в своих потоках и связаны ограниченными очередями:
+    ссылки запрашиваются, пока обход еще идет, а запись не ждет конца
+    получения ссылок. Каждый путь отправляется за ссылками не больше одного раза.
+    """
+
+    def __init__(self, client, batch_size=100, queue_size=8, fetch_links=True, needs_links=None,
+                 download_links=False, folder_depth=None):
+        self.client = client
+        self.batch_size = batch_size
+        self.fetch_links = fetch_links
+        # Ссылки на скачивание истекают через час-другой, поэтому по умолчанию только публичные
+        self.download_links = download_links
+        # Не None - публикуем папки этой глубины, а ссылки файлов строим внутри них
+        self.folder_depth = folder_depth
+        # needs_links(file_item) -> bool: каким файлам нужны ссылки (по умолчанию всем)
+        self.needs_links = needs_links or (lambda file_item: True)
+
+        self.files_queue = queue.Queue(maxsize=queue_size)
+        self.rows_queue = queue.Queue(maxsize=queue_size)
+
+        self._requested_paths = set()
+        self._errors = []
+        self._stop = threading.Event()
+        self.stats = {'crawl': 0.0, 'links': 0.0, 'write': 0.0, 'total': 0.0,
+                      'files': 0, 'links_requested': 0, 'public_harvested': 0}
+
+    def _fail(self, error):
+        if not isinstance(error, PipelineStopped):
+            self._errors.append(error)
+        self._stop.set()
+
+    def _put(self, target_queue, item):
+        """put в ограниченную очередь, который не зависает, если читающий этап уже упал"""
+        while True:
+            if self._stop.is_set() and item is not _DONE:
+                raise PipelineStopped()
+            try:
+                target_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    # Конец потока тоже не ждем: читатель выйдет сам через _get
+                    return
+
+    def _get(self, source_queue):
+        """get из очереди: после падения любого этапа сразу возвращает конец потока"""
+        while not self._stop.is_set():
+            try:
+                return source_queue.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _put_files(self, files):
+        self._put(self.files_queue, files)
+
+    def _crawl(self):
+        start_time = time.time()
+        try:
+            self.client.get_flat_file_list(on_files=self._put_files, use_cache=False)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self.stats['crawl'] = time.time() - start_time
+            self._put(self.files_queue, _DONE)
+
+    def _resolve_links(self):
+        try:
+            while True:
+                files = self._get(self.files_queue)
+                if files is _DONE:
+                    break
+
+                for i in range(0, len(files), self.batch_size):
+                    batch_files = files[i:i + self.batch_size]
+                    self._put(self.rows_queue, (batch_files, self._get_links(batch_files)))
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.rows_queue, _DONE)
+
+    def _get_links(self, batch_files):
+        if not self.fetch_links:
+            return {}
+
+        file_paths = []
+        harvested = {}
+        for file_item in batch_files:
+            path = file_item['path']
+            if path not in self._requested_paths and self.needs_links(file_item):
+                self._requested_paths.add(path)
+                file_paths.append({'path': path})
+                if file_item.get('public_url'):
+                    harvested[path] = file_item['public_url']
+
+        if not file_paths:
+            return {}
+
+        # Опубликованные файлы получат ссылку из кэша клиента - без PUT /publish и GET
+        self.client.remember_public_links(harvested)
+        self.stats['public_harvested'] += len(harvested)
+
+        start_time = time.time()
+        if self.folder_depth is not None:
+            # У опубликованных файлов ссылка уже есть в листинге - папку ради них не публикуем
+            file_paths = [fp for fp in file_paths if fp['path'] not in harvested]
+            results = self.client.batch_get_folder_links(file_paths, self.folder_depth) if file_paths else []
+        else:
+            results = self.client.batch_get_links_hyper_optimized(file_paths, download_links=self.download_links)
+        self.stats['links'] += time.time() - start_time
+        self.stats['links_requested'] += len(file_paths)
+
+        return {result['path']: result for result in results}
+
+    def run(self, on_batch):
+        """Прогоняет все файлы через этапы; on_batch(files, links) вызывается в текущем потоке"""
+        start_time = time.time()
+        stages = [
+            threading.Thread(target=self._crawl, name='index-crawl', daemon=True),
+            threading.Thread(target=self._resolve_links, name='index-links', daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+
+        try:
+            while True:
+                item = self._get(self.rows_queue)
+                if item is _DONE:
+                    break
+
+                batch_files, links_dict = item
+                write_start = time.time()
+                on_batch(batch_files, links_dict)
+                self.stats['write'] += time.time() - write_start
+                self.stats['files'] += len(batch_files)
+        except Exception as e:
+            self._fail(e)
+
+        for stage in stages:
+            stage.join()
+
+        self.stats['total'] = time.time() - start_time
+
+        if self._errors:
+            raise self._errors[0]
+
+        return self.stats
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUMemo:
+    """Ограниченный LRU-кэш результатов со счетчиками попаданий.
+
+    В отличие от functools.lru_cache, значение вычисляется переданной функцией
+    с любыми аргументами (в том числе списками), а ключом служит только key.
+    maxsize=0 отключает кэш - удобно для сравнения в бенчмарке.
+    ttl (в секундах) ограничивает время жизни записи.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize, name='', ttl=None):
+        self.maxsize = maxsize
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (срок годности или None, значение)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        """Значение или _MISSING; вызывается под блокировкой"""
+        entry = self._data.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires is None or expires > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return self._MISSING
+
+    def get(self, key, default=None):
+        if self.maxsize <= 0:
+            return default
+
+        with self._lock:
+            value = self._lookup(key)
+        return default if value is self._MISSING else value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute, *args):
+        if self.maxsize <= 0:
+            return compute(*args)
+
+        with self._lock:
+            value = self._lookup(key)
+        if value is not self._MISSING:
+            return value
+
+        value = compute(*args)
+        self.set(key, value)
+        return value
+
+    def after_fork(self):
+        """Новая блокировка в дочернем процессе: старую мог держать другой поток родителя"""
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,80 @@
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from explorer.utils.ranking import TopK, rank_top_k
+from explorer.utils.smart_search import SmartSearch
+
+# Индекс, унаследованный рабочим процессом при fork
+_WORKER_INDEX = None
+
+
+def _init_worker(search_index):
+    global _WORKER_INDEX
+    _WORKER_INDEX = search_index
+
+    # Кэши остаются теплыми, но их блокировки в момент fork могли держать другие потоки
+    SmartSearch.SIMILARITY_CACHE.after_fork()
+    SmartSearch.QUERY_CACHE.after_fork()
+
+
+def _score_shard(query_info, positions, threshold, limit):
+    """Оценка своего куска кандидатов в рабочем процессе: локальный top-K или все результаты"""
+    shard = array('i')
+    shard.frombytes(positions)
+    scored = _WORKER_INDEX._score(query_info, shard, threshold)
+    return rank_top_k(scored, limit) if limit else list(scored)
+
+
+class ScoringPool:
+    """Пул процессов для оценки больших выборок кандидатов.
+
+    Рабочие процессы получают индекс через fork (копирование при записи),
+    поэтому между процессами передаются только запрос и позиции кандидатов.
+    Кандидаты делятся на непрерывные куски по позициям, каждый процесс
+    возвращает свой top-K, а родитель сливает их с тем же порядком равных
+    рейтингов, что и при последовательной оценке.
+    """
+
+    def __init__(self, search_index, workers):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            # Без fork пришлось бы передавать весь индекс каждому процессу
+            raise ValueError('Параллельная оценка требует fork')
+
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=(search_index,),
+        )
+
+    def score(self, query_info, positions, threshold, limit):
+        """[(позиция, relevance)] в итоговом порядке или None, если пул уже недоступен"""
+        if not positions:
+            return []
+
+        size = -(-len(positions) // self.workers)
+        try:
+            futures = [
+                self.executor.submit(_score_shard, query_info, array('i', positions[i:i + size]).tobytes(),
+                                     threshold, limit)
+                for i in range(0, len(positions), size)
+            ]
+            shards = [future.result() for future in futures]
+        except (BrokenProcessPool, RuntimeError):
+            # Пул закрыт после смены поколения или рабочий процесс упал
+            return None
+
+        if not limit:
+            return sorted((item for shard in shards for item in shard), key=lambda item: (-item[1], item[0]))
+
+        top = TopK(limit)
+        for shard in shards:
+            for pos, relevance in shard:
+                top.push(relevance, pos, (pos, relevance))
+        return top.results()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
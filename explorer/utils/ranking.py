@@ -0,0 +1,46 @@
+import heapq
+
+# Больше этого SmartSearch не ставит
+MAX_RELEVANCE = 100
+
+
+class TopK:
+    """Лучшие k результатов без сортировки всего списка.
+
+    При равной релевантности выше тот, кто пришел раньше (меньший order),
+    как при стабильной сортировке полного списка.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        # Минимальная куча: на вершине худший из лучших
+        self._heap = []
+
+    def push(self, relevance, order, item):
+        entry = (relevance, -order, item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def is_full_of(self, relevance):
+        """Все k мест заняты результатами не хуже relevance"""
+        return len(self._heap) == self.k and self._heap[0][0] >= relevance
+
+    def results(self):
+        return [item for _, _, item in sorted(self._heap, reverse=True)]
+
+
+def rank_top_k(scored, limit):
+    """Лучшие limit пар (позиция, relevance) из потока, упорядоченного по позиции.
+
+    Как только набрано limit результатов с максимальной релевантностью,
+    остальные кандидаты уже не могут их вытеснить - дальше не считаем.
+    """
+    top = TopK(limit)
+    for order, relevance in scored:
+        top.push(relevance, order, (order, relevance))
+        if top.is_full_of(MAX_RELEVANCE):
+            break
+    return top.results()
+
@@ -0,0 +1,151 @@
+import threading
+import time
+
+from django.conf import settings
+
+from explorer.utils.fts_index import FTSSearchIndex, fts_enabled, fts_generation
+from explorer.utils.memo import LRUMemo
+from explorer.utils.search_index import get_search_index
+from explorer.utils.smart_search import SmartSearch
+from explorer.utils.yandex_disk import YandexDiskClient
+
+
+def format_size(size_bytes):
+    """Форматирует размер файла в читаемый вид"""
+    if size_bytes == 0:
+        return "0 Б"
+
+    size_names = ["Б", "КБ", "МБ", "ГБ", "ТБ"]
+    i = 0
+    while size_bytes >= 1024 and i < len(size_names) - 1:
+        size_bytes /= 1024.0
+        i += 1
+
+    return f"{size_bytes:.2f} {size_names[i]}"
+
+
+class SearchEngine:
+    """Единый поиск для сайта, JSON API и бота: индекс, оценка, страницы и тайминги"""
+
+    MAX_LIMIT = 100
+    # Глубже этой позиции рейтинги не кэшируем, чтобы запись не росла без предела
+    MAX_CACHED_RESULTS = 1000
+
+    def __init__(self):
+        # Клиент нужен только для относительных путей - один на процесс
+        self.yandex_client = YandexDiskClient()
+        self.result_cache = LRUMemo(
+            getattr(settings, 'SEARCH_RESULT_CACHE_SIZE', 1024),
+            name='results',
+            ttl=getattr(settings, 'SEARCH_RESULT_CACHE_TTL', 600),
+        )
+
+    def get_index(self):
+        """FTS5, если он включен и собран для действующего поколения, иначе индекс в памяти"""
+        if fts_enabled():
+            generation = fts_generation()
+            if generation is not None:
+                return FTSSearchIndex(generation)
+        return get_search_index()
+
+    def search(self, query, threshold=5, offset=0, limit=100):
+        """Страница результатов поиска с разбивкой времени по этапам"""
+        start_time = time.perf_counter()
+        offset = max(int(offset), 0)
+        limit = min(max(int(limit), 1), self.MAX_LIMIT)
+
+        timings = {}
+        search_index = self.get_index()
+        # Отпечаток берем у выбранного индекса: поколение могло смениться после выбора
+        signature = search_index.signature
+        # Берем на один результат больше, чтобы знать, есть ли следующая страница
+        top_results = self.rank(search_index, signature, query, threshold, offset + limit + 1, timings)
+        has_more = len(top_results) > offset + limit
+        page = top_results[offset:offset + limit]
+
+        serialize_start = time.perf_counter()
+        # Ссылок в выдаче нет: по id их получает /d/<id> (или file_link) в момент клика
+        snapshot = search_index.page_snapshot([file_id for file_id, _ in page])
+        results = [self.serialize(snapshot, file_id, relevance) for file_id, relevance in page]
+        timings['serialization'] = time.perf_counter() - serialize_start
+        timings['total'] = time.perf_counter() - start_time
+
+        return {
+            'query': query,
+            'results': results,
+            'results_count': len(results),
+            'offset': offset,
+            'limit': limit,
+            'has_more': has_more,
+            'timings': timings,
+        }
+
+    def rank(self, search_index, signature, query, threshold, count, timings):
+        """Первые count пар (id, relevance) - из кэша, если запрос уже считался в поколении signature.
+
+        Рейтинг зависит только от нормализованного запроса целиком: стоп-слова
+        из ключа не убираем, по ним работает проверка вхождения запроса в имя.
+        """
+        start_time = time.perf_counter()
+        key = (
+            signature,
+            type(search_index).__name__,
+            # Пустой запрос ничего не ищет, а запрос из одних знаков находит все
+            SmartSearch.analyze_query(query)['norm'] if query else None,
+            threshold,
+        )
+
+        cached = self.result_cache.get(key)
+        # Первые count из top-K совпадают с top-count, а неполный список - это все результаты
+        if cached is not None and (cached[0] >= count or len(cached[1]) < cached[0]):
+            limit, results, candidates_count = cached
+            timings['cache_hit'] = True
+            timings['cache'] = time.perf_counter() - start_time
+            timings['candidates_count'] = candidates_count
+            return results[:count]
+
+        # Первую страницу считаем на всю глубину MAX_LIMIT, чтобы листание попадало в кэш
+        limit = max(count, self.MAX_LIMIT + 1)
+        results = search_index.search(query, threshold=threshold, limit=limit, timings=timings)
+        if limit <= self.MAX_CACHED_RESULTS:
+            self.result_cache.set(key, (limit, results, timings.get('candidates_count', 0)))
+        timings['cache_hit'] = False
+        return results[:count]
+
+    def serialize(self, snapshot, file_id, relevance):
+        """Результат поиска в общем для всех потребителей виде - из снапшота, без моделей ORM"""
+        pos = snapshot.position(file_id)
+        path = snapshot.paths[pos]
+        size = snapshot.sizes[pos]
+
+        relative_path = self.yandex_client.get_relative_path(path)
+        path_parts = relative_path.split('/')
+        display_path = ' / '.join(path_parts[:-1]) if len(path_parts) > 1 else 'Корневая папка'
+
+        return {
+            'id': file_id,
+            'name': snapshot.names[pos],
+            'path': display_path,
+            'full_path': path,
+            'size': size,
+            'size_formatted': format_size(size),
+            'modified': snapshot.modified[pos],
+            'media_type': snapshot.media_types[pos],
+            'file_type': snapshot.file_types[pos],
+            'relevance': relevance
+        }
+
+
+_SEARCH_ENGINE = None
+_SEARCH_ENGINE_LOCK = threading.Lock()
+
+
+def get_search_engine():
+    """Поисковый движок процесса; индекс внутри сам следит за обновлениями FileIndex"""
+    global _SEARCH_ENGINE
+
+    if _SEARCH_ENGINE is None:
+        with _SEARCH_ENGINE_LOCK:
+            if _SEARCH_ENGINE is None:
+                _SEARCH_ENGINE = SearchEngine()
+    return _SEARCH_ENGINE
@@ -0,0 +1,296 @@
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from explorer.models import FileIndex
+from explorer.utils.file_snapshot import FileSnapshot
+from explorer.utils.fuzzy import FuzzyIndex, search_radius
+from explorer.utils.index_generation import get_active_generation
+from explorer.utils.parallel_scoring import ScoringPool
+from explorer.utils.ranking import rank_top_k
+from explorer.utils.smart_search import SmartSearch
+
+
+class SearchIndex:
+    """Инвертированный индекс по словам и триграммам имен файлов.
+
+    Индекс не заменяет SmartSearch, а только быстро отбирает кандидатов:
+    каждый файл, который SmartSearch оценил бы выше нуля, гарантированно
+    попадает в выборку, поэтому итоговый рейтинг совпадает с полным перебором.
+    """
+
+    def __init__(self, rows, signature=None):
+        self.signature = signature
+        # Данные файлов по позициям строк (позиции идут по возрастанию id)
+        self.snapshot = FileSnapshot()
+
+        # позиция -> нормализованное имя и слова имени длиннее 2 символов
+        self.name_norms = []
+        self.file_words = []
+        # слово -> варианты (get_word_variations), посчитанные при индексации
+        self.word_variations = {}
+
+        # слово -> позиции файлов (по возрастанию)
+        self.postings = defaultdict(lambda: array('i'))
+        # триграмма -> слова словаря (для поиска подстрок)
+        self.word_trigrams = defaultdict(set)
+        # вариант слова -> слова словаря (для get_word_variations)
+        self.variation_words = defaultdict(set)
+        # триграмма варианта -> слова словаря (вхождение запроса в вариант)
+        self.variation_trigrams = defaultdict(set)
+        # слово без расширения -> слова словаря (опечатки сравниваются без расширения)
+        self.stem_words = defaultdict(set)
+        # Индекс словаря для опечаток, строится вместе с индексом
+        self.fuzzy_index = None
+        # Пул процессов для больших выборок: None - еще не создан, False - недоступен
+        self._scoring_pool = None
+        self._pool_lock = threading.Lock()
+
+        self._build(rows)
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _build(self, rows):
+        for file_id, name, path, size, modified, media_type, file_type, search_vector, search_tokens in rows:
+            pos = self.snapshot.append(file_id, name, path, size, modified, media_type, file_type)
+
+            name_norm, words, variations = SmartSearch.prepared_name(name, search_vector, search_tokens)
+
+            self.name_norms.append(name_norm)
+            self.file_words.append(tuple(word for word in words if len(word) > 2))
+            for word, word_variations in variations.items():
+                self.word_variations.setdefault(word, word_variations)
+
+            seen = set()
+            for word in words:
+                if word not in seen:
+                    seen.add(word)
+                    self.postings[word].append(pos)
+
+        for word in self.postings:
+            for trigram in self.trigrams(word):
+                self.word_trigrams[trigram].add(word)
+
+            # SmartSearch сравнивает только слова длиннее 2 символов
+            if len(word) <= 2:
+                continue
+
+            for variation in self.word_variations[word]:
+                self.variation_words[variation].add(word)
+                for trigram in self.trigrams(variation):
+                    self.variation_trigrams[trigram].add(word)
+
+            self.stem_words[SmartSearch.strip_extension(word)].add(word)
+
+        self.fuzzy_index = FuzzyIndex(self.stem_words)
+
+    def get_scoring_pool(self):
+        """Пул процессов для оценки или None, если параллельная оценка выключена"""
+        workers = getattr(settings, 'SEARCH_SCORING_WORKERS', 0)
+        if workers < 2:
+            return None
+
+        if self._scoring_pool is None:
+            with self._pool_lock:
+                if self._scoring_pool is None:
+                    try:
+                        self._scoring_pool = ScoringPool(self, workers)
+                        print(f"✅ Scoring pool started: {workers} processes")
+                    except ValueError as e:
+                        print(f"⚠️ Parallel scoring disabled: {e}")
+                        self._scoring_pool = False
+        return self._scoring_pool or None
+
+    def close(self):
+        """Останавливает пул процессов индекса, замененного новым поколением"""
+        if self._scoring_pool:
+            self._scoring_pool.close()
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def _words_with_substring(self, fragment, trigram_map, vocabulary):
+        """Слова словаря, в которых (или в вариантах которых) встречается fragment"""
+        grams = self.trigrams(fragment)
+        if not grams:
+            return [word for word in vocabulary if fragment in word]
+
+        words = None
+        for gram in sorted(grams, key=lambda g: len(trigram_map.get(g, ()))):
+            bucket = trigram_map.get(gram)
+            if not bucket:
+                return []
+            words = set(bucket) if words is None else words & bucket
+            if not words:
+                return []
+        return words
+
+    def _similar_words(self, q_word, q_variations):
+        """Слова словаря, для которых calculate_similarity(q_word, word) > 0"""
+        candidates = set()
+
+        for var1 in q_variations:
+            # Совпадение вариантов
+            candidates.update(self.variation_words.get(var1, ()))
+
+            if len(var1) < 3:
+                continue
+
+            # Вариант запроса содержится в варианте слова
+            for word in self._words_with_substring(var1, self.variation_trigrams, ()):
+                candidates.add(word)
+
+            # Вариант слова содержится в варианте запроса
+            for start in range(len(var1) - 2):
+                for end in range(start + 3, len(var1) + 1):
+                    candidates.update(self.variation_words.get(var1[start:end], ()))
+
+        # Опечатки: только слова словаря в пределах допустимого числа правок
+        q_stem = SmartSearch.strip_extension(q_word)
+        for stem, _ in self.fuzzy_index.search(q_stem, search_radius(len(q_stem))):
+            candidates.update(self.stem_words[stem])
+
+        return [
+            word for word in candidates
+            if SmartSearch.cached_similarity(q_word, q_variations, word, self.word_variations[word]) > 0.6
+        ]
+
+    def candidates(self, query):
+        """Возвращает отсортированные id файлов, которые могут получить ненулевой рейтинг"""
+        return [self.snapshot.ids[pos] for pos in self._candidates(SmartSearch.analyze_query(query))]
+
+    def _candidates(self, query_info):
+        """Отсортированные позиции кандидатов"""
+        query_norm = query_info['norm']
+        if not query_norm.strip():
+            # Пустая нормализованная строка входит в любое имя
+            return list(range(len(self.snapshot)))
+
+        words = set()
+
+        # Запрос целиком входит в имя: самый длинный фрагмент запроса
+        # обязан быть подстрокой одного из слов имени
+        fragment = max(query_norm.split(' '), key=len)
+        words.update(
+            word for word in self._words_with_substring(fragment, self.word_trigrams, self.postings)
+            if fragment in word
+        )
+
+        for q_word in query_info['words']:
+            words.update(self._similar_words(q_word, query_info['variations'][q_word]))
+
+        positions = set()
+        for word in words:
+            positions.update(self.postings[word])
+        return sorted(positions)
+
+    def search(self, query, threshold=0, limit=None, timings=None):
+        """Возвращает [(id, relevance)] в порядке убывания релевантности.
+
+        В timings (если передан словарь) записывается время отбора кандидатов и оценки.
+        """
+        if not query:
+            return []
+
+        start_time = time.perf_counter()
+
+        # Запрос разбираем один раз, имена файлов разобраны при индексации
+        query_info = SmartSearch.analyze_query(query)
+        candidate_positions = self._candidates(query_info)
+        candidates_time = time.perf_counter()
+
+        results = None
+        workers = 1
+        # Маленьким выборкам обмен с процессами обойдется дороже самой оценки
+        if len(candidate_positions) >= getattr(settings, 'SEARCH_PARALLEL_MIN_CANDIDATES', 20000):
+            pool = self.get_scoring_pool()
+            if pool is not None:
+                results = pool.score(query_info, candidate_positions, threshold, limit)
+                workers = pool.workers if results is not None else 1
+
+        if results is None:
+            scored = self._score(query_info, candidate_positions, threshold)
+            if limit:
+                # Куча на limit мест и остановка, когда лучше уже не будет
+                results = rank_top_k(scored, limit)
+            else:
+                # Стабильная сортировка по позиции повторяет порядок полного перебора таблицы
+                results = sorted(scored, key=lambda item: item[1], reverse=True)
+
+        if timings is not None:
+            timings['candidates'] = candidates_time - start_time
+            timings['scoring'] = time.perf_counter() - candidates_time
+            timings['candidates_count'] = len(candidate_positions)
+            timings['workers'] = workers
+
+        ids = self.snapshot.ids
+        return [(ids[pos], relevance) for pos, relevance in results]
+
+    def page_snapshot(self, file_ids):
+        """Снапшот с данными для выдачи: у индекса в памяти он уже есть"""
+        return self.snapshot
+
+    def _score(self, query_info, candidate_positions, threshold):
+        """Лениво оценивает кандидатов по возрастанию позиции: (позиция, relevance) выше порога"""
+        names = self.snapshot.names
+        for pos in candidate_positions:
+            if not names[pos]:
+                continue
+            relevance = SmartSearch.score_prepared(
+                query_info, self.name_norms[pos], self.file_words[pos], self.word_variations
+            )
+            if relevance > threshold:
+                yield pos, relevance
+
+
+_SEARCH_INDEX = None
+_SEARCH_INDEX_LOCK = threading.Lock()
+
+
+def get_index_signature():
+    """Отпечаток индекса: номер действующего поколения.
+
+    Для базы, собранной до появления поколений, - агрегаты таблицы FileIndex.
+    """
+    generation = get_active_generation()
+    if generation is not None:
+        return 'generation', generation
+
+    stats = FileIndex.objects.aggregate(
+        count=Count('id'),
+        max_id=Max('id'),
+        updated=Max('updated_at'),
+    )
+    return stats['count'], stats['max_id'], stats['updated']
+
+
+def get_search_index():
+    """Возвращает индекс процесса, перестраивая его один раз на новое поколение"""
+    global _SEARCH_INDEX
+
+    signature = get_index_signature()
+    if _SEARCH_INDEX is not None and _SEARCH_INDEX.signature == signature:
+        return _SEARCH_INDEX
+
+    with _SEARCH_INDEX_LOCK:
+        if _SEARCH_INDEX is not None and _SEARCH_INDEX.signature == signature:
+            return _SEARCH_INDEX
+
+        start_time = time.time()
+        rows = FileIndex.objects.order_by('id').values_list(
+            *FileSnapshot.FIELDS, 'search_vector', 'search_tokens'
+        ).iterator(chunk_size=5000)
+        previous_index = _SEARCH_INDEX
+        _SEARCH_INDEX = SearchIndex(rows, signature=signature)
+        if previous_index is not None:
+            previous_index.close()
+        print(f"✅ Search index built: {len(_SEARCH_INDEX)} files, "
+              f"{len(_SEARCH_INDEX.postings)} words in {time.time() - start_time:.2f}s")
+
+    return _SEARCH_INDEX
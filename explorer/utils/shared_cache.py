@@ -0,0 +1,211 @@
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+from explorer.utils.cache_keys import path_key
+
+
+class SQLiteCache(BaseCache):
+    """Кэш-бэкенд Django в отдельном SQLite-файле.
+
+    Общий для всех процессов на машине (веб-сервер, update_file_index, бот),
+    не требует внешних сервисов. WAL позволяет читать во время записи,
+    а очистка старых записей выполняется раз в CULL_EVERY записей, а не на
+    каждый set, как у FileBasedCache/DatabaseCache.
+    """
+
+    CULL_EVERY = 500
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = str(location)
+        self._local = threading.local()
+        self._sets = 0
+        self._sets_lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.location, timeout=30, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _is_alive(expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or not self._is_alive(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+
+        result = {}
+        db_keys = list(key_map)
+        # SQLite ограничивает число параметров в запросе
+        for i in range(0, len(db_keys), 500):
+            chunk = db_keys[i:i + 500]
+            rows = self._connection().execute(
+                f"SELECT key, value, expires FROM cache WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            )
+            for db_key, value, expires in rows:
+                if self._is_alive(expires):
+                    result[key_map[db_key]] = pickle.loads(value)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in data.items()
+        ]
+
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)', rows)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        self._maybe_cull(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        db_key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        connection.execute('DELETE FROM cache WHERE key = ? AND expires <= ?', (db_key, time.time()))
+        cursor = connection.execute(
+            'INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (db_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout)),
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        db_key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), db_key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        db_key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM cache WHERE key = ?', (db_key,)).rowcount == 1
+
+    def has_key(self, key, version=None):
+        return self.get(key, self._missing_key, version=version) is not self._missing_key
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _maybe_cull(self, added):
+        with self._sets_lock:
+            self._sets += added
+            if self._sets < self.CULL_EVERY:
+                return
+            self._sets = 0
+
+        connection = self._connection()
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # Удаляем записи, которые истекут раньше всех
+            to_delete = count // self._cull_frequency if self._cull_frequency else count
+            connection.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)', (to_delete,)
+            )
+
+    def close(self, **kwargs):
+        # Соединения живут в потоке, закрывать после каждого запроса не нужно
+        pass
+
+
+class SharedCache:
+    """Кэш папок и ссылок, общий для всех процессов, со стабильными ключами и метриками"""
+
+    def __init__(self, alias=None):
+        self.alias = alias or getattr(settings, 'YANDEX_SHARED_CACHE_ALIAS', 'shared')
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _count(self, namespace, hits=0, misses=0, sets=0):
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'sets': 0})
+            stats['hits'] += hits
+            stats['misses'] += misses
+            stats['sets'] += sets
+
+    def get(self, namespace, path):
+        cached = self.backend.get(path_key(namespace, path))
+        if cached is None:
+            self._count(namespace, misses=1)
+        else:
+            self._count(namespace, hits=1)
+        return cached
+
+    def set(self, namespace, path, data, timeout):
+        self.backend.set(path_key(namespace, path), data, timeout=timeout)
+        self._count(namespace, sets=1)
+
+    def get_many(self, entries):
+        """Один запрос к кэшу для списка пар (namespace, path) -> {(namespace, path): значение}"""
+        keys = {path_key(namespace, path): (namespace, path) for namespace, path in entries}
+        found = self.backend.get_many(list(keys))
+
+        result = {}
+        for key, entry in keys.items():
+            if found.get(key) is None:
+                self._count(entry[0], misses=1)
+            else:
+                self._count(entry[0], hits=1)
+                result[entry] = found[key]
+        return result
+
+    def set_many(self, namespace, data, timeout):
+        """Один запрос к кэшу для словаря {path: значение}"""
+        if data:
+            self.backend.set_many({path_key(namespace, path): value for path, value in data.items()},
+                                  timeout=timeout)
+            self._count(namespace, sets=len(data))
+
+    def get_stats(self):
+        """Попадания, промахи и hit rate по пространствам имен"""
+        with self._lock:
+            stats = {namespace: dict(values) for namespace, values in self._stats.items()}
+
+        for values in stats.values():
+            lookups = values['hits'] + values['misses']
+            values['hit_rate'] = values['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+shared_cache = SharedCache()
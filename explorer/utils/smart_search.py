@@ -0,0 +1,263 @@
+import re
+
+from explorer.utils import fuzzy
+from explorer.utils.memo import LRUMemo
+
+
+class SmartSearch:
+    """Класс для умного поиска как в Google"""
+
+    # Список стоп-слов (игнорируются при поиске)
+    STOP_WORDS = {
+        'для', 'на', 'в', 'с', 'по', 'из', 'у', 'о', 'от', 'до', 'за', 'к', 'со', 'во', 'не', 'ни',
+        'об', 'под', 'над', 'при', 'про', 'до', 'после', 'через', 'между', 'среди', 'вокруг',
+        'перед', 'возле', 'около', 'вдоль', 'поперек', 'сквозь', 'благодаря', 'вопреки', 'согласно',
+        'вследствие', 'ввиду', 'насчет', 'вроде', 'включая', 'исключая', 'не считая', 'спустя',
+        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+        'из-за', 'из-под', 'по-над', 'по-под', 'и', 'или', 'да', 'но', 'зато', 'однако', 'же', 'ведь',
+        'что', 'как', 'когда', 'где', 'куда', 'откуда', 'почему', 'зачем', 'сколько', 'который',
+        'какой', 'чей', 'кто', 'что', 'это', 'то', 'все', 'всё', 'весь', 'каждый', 'любой', 'никакой',
+        'некий', 'некоторый', 'мой', 'твой', 'его', 'её', 'наш', 'ваш', 'их', 'свой', 'сам', 'самый',
+        'другой', 'иной', 'каковой', 'который', 'чей', 'сколько', 'столько', 'такой', 'эдакий',
+        'оный', 'сей', 'всякий', 'каждый', 'любой', 'никакой', 'некий', 'некоторый'
+    }
+
+    # Одни и те же пары слов (NUOVO, Complanar...) встречаются в тысячах имен,
+    # а популярные запросы повторяются - запоминаем результаты
+    SIMILARITY_CACHE = LRUMemo(200000, name='similarity')
+    QUERY_CACHE = LRUMemo(1024, name='query')
+
+    # Расширение в конце слова; от слова остается хотя бы один символ
+    EXTENSION_RE = re.compile(r'(?<=.)\.\w{1,5}$')
+
+    @staticmethod
+    def normalize_text(text):
+        """Нормализует текст для поиска"""
+        if not text:
+            return ""
+
+        # Приводим к нижнему регистру и убираем лишние пробелы
+        text = str(text).lower().strip()
+
+        # Убираем пунктуацию кроме дефисов и точек в расширениях
+        text = re.sub(r'[^\w\s\-\.]', ' ', text)
+
+        # Заменяем множественные пробелы на один
+        text = re.sub(r'\s+', ' ', text)
+
+        return text
+
+    @staticmethod
+    def filter_stop_words(words):
+        """Фильтрует стоп-слова из списка слов"""
+        return [word for word in words if word not in SmartSearch.STOP_WORDS and len(word) > 2]
+
+    @staticmethod
+    def get_word_variations(word):
+        """Генерирует варианты слова для поиска"""
+        if len(word) <= 3:
+            return [word]
+
+        variations = set()
+        variations.add(word)
+
+        # Базовые формы для русского языка
+        if word.endswith('ь'):
+            variations.add(word[:-1])  # дверь -> двер
+        if word.endswith('и'):
+            variations.add(word[:-1] + 'а')  # двери -> дверь
+            variations.add(word[:-1] + 'ь')  # двери -> дверь
+        if word.endswith('ой'):
+            variations.add(word[:-2] + 'ая')  # дверной -> дверная
+        if word.endswith('ая'):
+            variations.add(word[:-2] + 'ой')  # дверная -> дверной
+        if word.endswith('ый'):
+            variations.add(word[:-2] + 'ая')  # дверный -> дверная
+        if word.endswith('ом'):
+            variations.add(word[:-2])  # двером -> дверь
+        if word.endswith('ам'):
+            variations.add(word[:-2])  # дверям -> дверь
+
+        # Добавляем основу
+        base = word
+        if len(word) > 4:
+            if word.endswith(('ой', 'ая', 'ое', 'ые', 'ий', 'ый')):
+                base = word[:-2]
+            elif word.endswith(('ь', 'и', 'ы', 'а', 'я', 'о', 'е', 'у', 'ю')):
+                base = word[:-1]
+
+            if base and len(base) > 3:
+                variations.add(base)
+
+        return list(variations)
+
+    @staticmethod
+    def calculate_similarity(word1, word2):
+        """Вычисляет схожесть между двумя словами"""
+        if not word1 or not word2:
+            return 0
+
+        # Полное совпадение
+        if word1 == word2:
+            return 1.0
+
+        # Получаем варианты слов
+        variations1 = SmartSearch.get_word_variations(word1)
+        variations2 = SmartSearch.get_word_variations(word2)
+
+        return SmartSearch.similarity_with_variations(word1, variations1, word2, variations2)
+
+    @staticmethod
+    def similarity_with_variations(word1, variations1, word2, variations2):
+        """calculate_similarity для слов с уже посчитанными вариантами"""
+        if not word1 or not word2:
+            return 0
+
+        # Полное совпадение
+        if word1 == word2:
+            return 1.0
+
+        # Проверяем совпадение вариантов
+        for var1 in variations1:
+            for var2 in variations2:
+                if var1 == var2:
+                    return 0.95
+
+        # Проверяем вхождение одной основы в другую
+        for var1 in variations1:
+            for var2 in variations2:
+                if var1 in var2 or var2 in var1:
+                    if len(var1) >= 3 and len(var2) >= 3:
+                        return 0.8
+
+        # Опечатки: последнее слово имени несет расширение, сравниваем без него
+        return fuzzy.similarity(SmartSearch.strip_extension(word1), SmartSearch.strip_extension(word2))
+
+    @staticmethod
+    def strip_extension(word):
+        """Слово без расширения файла: complanar.pdf -> complanar"""
+        return SmartSearch.EXTENSION_RE.sub('', word)
+
+    @staticmethod
+    def analyze_name(file_name):
+        """Нормализованное имя, его слова и их варианты - считается один раз при индексации"""
+        name_norm = SmartSearch.normalize_text(file_name)
+        words = name_norm.split()
+
+        return {
+            'norm': name_norm,
+            'words': words,
+            'variations': {word: SmartSearch.get_word_variations(word) for word in words if len(word) > 2},
+        }
+
+    @staticmethod
+    def prepared_name(name, search_vector, search_tokens):
+        """(имя, слова, варианты) из полей FileIndex; строки старого индекса без токенов разбираются на месте"""
+        if search_tokens:
+            return search_vector, search_tokens['words'], search_tokens['variations']
+
+        name_info = SmartSearch.analyze_name(name)
+        return name_info['norm'], name_info['words'], name_info['variations']
+
+    @staticmethod
+    def cached_similarity(word1, variations1, word2, variations2):
+        """similarity_with_variations с LRU-кэшем по паре слов"""
+        return SmartSearch.SIMILARITY_CACHE.get_or_compute(
+            (word1, word2), SmartSearch.similarity_with_variations, word1, variations1, word2, variations2
+        )
+
+    @staticmethod
+    def analyze_query(query):
+        """Разбор запроса с LRU-кэшем; результат общий, изменять его нельзя"""
+        return SmartSearch.QUERY_CACHE.get_or_compute(query, SmartSearch._analyze_query, query)
+
+    @staticmethod
+    def get_cache_stats():
+        """Попадания и промахи кэшей похожести и разбора запросов"""
+        return {memo.name: memo.get_stats() for memo in (SmartSearch.SIMILARITY_CACHE, SmartSearch.QUERY_CACHE)}
+
+    @staticmethod
+    def _analyze_query(query):
+        """Нормализованный запрос, значимые слова и их варианты - один раз на запрос"""
+        query_norm = SmartSearch.normalize_text(query)
+        query_words = SmartSearch.filter_stop_words(query_norm.split())
+
+        return {
+            'norm': query_norm,
+            'words': query_words,
+            'variations': {word: SmartSearch.get_word_variations(word) for word in query_words},
+        }
+
+    @staticmethod
+    def smart_search(query, file_name):
+        """Умный поиск как в Google"""
+        if not query or not file_name:
+            return 0
+
+        name_info = SmartSearch.analyze_name(file_name)
+        return SmartSearch.score_prepared(
+            SmartSearch.analyze_query(query),
+            name_info['norm'],
+            [w for w in name_info['words'] if len(w) > 2],
+            name_info['variations'],
+        )
+
+    @staticmethod
+    def score_prepared(query_info, file_name_norm, file_words, word_variations):
+        """Рейтинг smart_search по заранее разобранным запросу и имени.
+
+        file_words - слова имени длиннее 2 символов, word_variations - их варианты.
+        """
+        # Если запрос полностью содержится в названии - максимальный рейтинг
+        if query_info['norm'] in file_name_norm:
+            return 100
+
+        query_words = query_info['words']
+
+        # Если после фильтрации не осталось значимых слов
+        if not query_words:
+            return 0
+
+        total_score = 0
+        matched_words = 0
+
+        for q_word in query_words:
+            q_variations = query_info['variations'][q_word]
+            word_found = False
+            word_score = 0
+
+            for f_word in file_words:
+                similarity = SmartSearch.cached_similarity(
+                    q_word, q_variations, f_word, word_variations[f_word]
+                )
+
+                if similarity > 0.9:
+                    word_score = max(word_score, 1.0)
+                    word_found = True
+                    break  # Нашли идеальное совпадение
+                elif similarity > 0.8:
+                    word_score = max(word_score, 0.8)
+                    word_found = True
+                elif similarity > 0.7:
+                    word_score = max(word_score, 0.6)
+                    word_found = True
+                elif similarity > 0.6:
+                    word_score = max(word_score, 0.4)
+                    word_found = True
+
+            if word_found:
+                total_score += word_score
+                matched_words += 1
+
+        # Если не нашли ни одного похожего слова - возвращаем 0
+        if matched_words == 0:
+            return 0
+
+        # Вычисляем общий рейтинг релевантности
+        base_score = (total_score / len(query_words)) * 80
+
+        # Бонус за совпадение всех слов запроса
+        if matched_words == len(query_words):
+            base_score += 20
+
+        return min(100, base_score)
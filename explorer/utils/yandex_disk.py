@@ -1,57 +1,135 @@
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
 from django.core.cache import cache
 import urllib.parse
 import concurrent.futures
 import time
 import threading
-import re
 from urllib.parse import urlparse
 import queue
 import asyncio
 import aiohttp
+from explorer.utils.async_crawler import AsyncDiskCrawler
+from explorer.utils.shared_cache import shared_cache
+from explorer.utils.cache_keys import make_key, normalize_path
 
 
 class YandexDiskClient:
+    # Статусы, при которых запрос повторяется с backoff (429/503 - с учетом Retry-After)
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
     def __init__(self):
         self.api_base_url = settings.YANDEX_DISK_CONFIG['API_BASE_URL']
         self.oauth_token = settings.YANDEX_DISK_CONFIG['OAUTH_TOKEN']
         self.root_folder = settings.YANDEX_DISK_CONFIG['ROOT_FOLDER']
         self.max_workers = getattr(settings, 'YANDEX_MAX_WORKERS', 16)  # Увеличиваем воркеры
         self.request_timeout = getattr(settings, 'REQUEST_TIMEOUT', 30)
+        self.crawler_engine = getattr(settings, 'YANDEX_CRAWLER_ENGINE', 'threads')
+        self.rate_limit = getattr(settings, 'YANDEX_RATE_LIMIT', 50)  # запросов в секунду
+        self.page_size = 1000  # максимум элементов на страницу в API
         self.headers = {
             'Authorization': f'OAuth {self.oauth_token}',
             'Accept': 'application/json'
         }
+        self.max_retries = getattr(settings, 'YANDEX_MAX_RETRIES', 5)
+        # Подписанные ссылки на скачивание живут недолго: храним их вместе со временем истечения
+        self.download_link_ttl = getattr(settings, 'YANDEX_DOWNLOAD_LINK_TTL', 3600)
         self._rate_limit_semaphore = threading.Semaphore(20)  # Увеличиваем лимит
-        self._last_request_time = 0
-        self._min_request_interval = 0.02  # Уменьшаем интервал
+        self._rate_lock = threading.Lock()
+        self._next_request_time = 0
+        self._min_request_interval = 1 / self.rate_limit
         self._share_cache = {}
         self._download_cache = {}
         self._cache_lock = threading.Lock()
+        # Папки последнего обхода, листинг которых не удалось получить целиком (пути disk:/...)
+        self.failed_folders = set()
+        # Все папки, найденные последним обходом: пустые тоже попадают в индекс папок
+        self.crawled_folders = set()
+
+        # Сессия создается лениво, чтобы размер пула совпадал с max_workers,
+        # который management-команды меняют после создания клиента
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'bytes': 0, 'errors': 0}
+
+    @property
+    def session(self):
+        """requests.Session с keep-alive, пулом соединений и повторами на 429/5xx"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    retry = Retry(
+                        total=self.max_retries,
+                        backoff_factor=0.5,
+                        status_forcelist=self.RETRY_STATUSES,
+                        allowed_methods=frozenset(['GET', 'PUT']),
+                        respect_retry_after_header=True,
+                        raise_on_status=False,
+                    )
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers, max_retries=retry)
+                    session = requests.Session()
+                    session.headers.update(self.headers)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def _wait_for_rate_limit(self):
+        """Потокобезопасный интервал между запросами: каждый поток резервирует свой слот"""
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_time - now
+            self._next_request_time = max(now, self._next_request_time) + self._min_request_interval
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def _count(self, **values):
+        with self._stats_lock:
+            for key, value in values.items():
+                self._stats[key] += value
+
+    def get_stats(self):
+        """Счетчики за время жизни клиента: запросы, новые соединения, повторы, байты"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        new_connections = 0
+        if self._session is not None:
+            for adapter in set(self._session.adapters.values()):
+                for key in list(adapter.poolmanager.pools.keys()):
+                    pool = adapter.poolmanager.pools.get(key)
+                    if pool is not None:
+                        new_connections += pool.num_connections
+
+        stats['connections'] = new_connections
+        stats['reused'] = max(0, stats['requests'] + stats['retries'] - new_connections)
+        return stats
 
     def _make_request(self, url, params=None, method='GET'):
         """Оптимизированный метод для выполнения запросов с rate limiting"""
         with self._rate_limit_semaphore:
-            current_time = time.time()
-            time_since_last_request = current_time - self._last_request_time
-            if time_since_last_request < self._min_request_interval:
-                time.sleep(self._min_request_interval - time_since_last_request)
-
-            self._last_request_time = time.time()
+            self._wait_for_rate_limit()
 
             try:
-                if method == 'GET':
-                    response = requests.get(url, headers=self.headers, params=params, timeout=self.request_timeout)
-                elif method == 'PUT':
-                    response = requests.put(url, headers=self.headers, params=params, timeout=self.request_timeout)
+                response = self.session.request(method, url, params=params, timeout=self.request_timeout)
+
+                retries = response.raw.retries
+                self._count(
+                    requests=1,
+                    retries=len(retries.history) if retries is not None else 0,
+                    bytes=len(response.content),
+                )
 
                 if response.status_code == 404:
                     return None
-                elif response.status_code == 429:
-                    print("⚠️ Rate limit hit, implementing backoff...")
-                    time.sleep(3)  # Увеличиваем паузу при rate limit
+                elif response.status_code in self.RETRY_STATUSES:
+                    print(f"⚠️ HTTP {response.status_code} after {self.max_retries} retries: {url}")
+                    self._count(errors=1)
                     return None
                 elif response.status_code != 200:
                     return None
@@ -59,57 +137,157 @@ class YandexDiskClient:
                 return response.json()
             except requests.exceptions.Timeout:
                 print("⏰ Request timeout")
+                self._count(requests=1, errors=1)
                 return None
             except requests.exceptions.RequestException as e:
                 print(f"❌ API Request error: {e}")
+                self._count(requests=1, errors=1)
                 return None
 
-    def get_folder_contents(self, path=''):
-        """Высокопроизводительное получение содержимого папки"""
+    def _full_disk_path(self, path):
+        """Путь вида disk:/... для запросов к API"""
         if not path:
             path = self.root_folder
 
         if not path.startswith('disk:/'):
-            full_path = f"disk:/{path}"
-        else:
-            full_path = path
-
-        cache_key = f"folder_{hash(full_path)}"
-        cached_data = cache.get(cache_key)
-
-        if cached_data:
-            return cached_data
-
-        print(f"🔍 Fetching contents for path: '{full_path}'")
+            return f"disk:/{path}"
+        return path
 
-        url = f"{self.api_base_url}"
+    def _fetch_folder_page(self, full_path, offset=0):
+        """Одна страница содержимого папки: (items, total)"""
         params = {
             'path': full_path,
-            'limit': 1000
+            'limit': self.page_size,
+            'offset': offset
         }
 
-        data = self._make_request(url, params)
+        data = self._make_request(self.api_base_url, params)
 
         if data and '_embedded' in data and 'items' in data['_embedded']:
-            items = data['_embedded']['items']
-            print(f"✅ Found {len(items)} items in '{full_path}'")
-            cache.set(cache_key, items, timeout=7200)
+            embedded = data['_embedded']
+            return embedded['items'], embedded.get('total')
+
+        return None, None
+
+    def get_folder_contents(self, path='', use_cache=True):
+        """Высокопроизводительное получение содержимого папки.
+
+        use_cache=False всегда запрашивает API; свежий листинг все равно попадает в кэш.
+        """
+        full_path = self._full_disk_path(path)
+
+        cached_data = shared_cache.get('folder', full_path) if use_cache else None
+
+        if cached_data:
+            return cached_data
+
+        print(f"🔍 Fetching contents for path: '{full_path}'")
+
+        items, total = self._fetch_folder_page(full_path)
+        if items is None:
+            # Пустой список неотличим от пустой папки - запоминаем, что листинг не получен
+            self.failed_folders.add(full_path)
+            return []
+
+        if total is None:
+            # API не вернул total - дочитываем страницы последовательно
+            if len(items) >= self.page_size:
+                for page in self.iter_folder_pages(full_path, offset=len(items)):
+                    items.extend(page)
+        elif total > len(items):
+            # Остальные страницы известны заранее - запрашиваем их параллельно
+            offsets = list(range(len(items), total, self.page_size))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(offsets))) as executor:
+                for page_items, _ in executor.map(lambda offset: self._fetch_folder_page(full_path, offset), offsets):
+                    if page_items is None:
+                        self.failed_folders.add(full_path)
+                    items.extend(page_items or [])
+
+        if full_path in self.failed_folders:
+            # Неполный листинг не кэшируем
+            print(f"⚠️ Incomplete listing for '{full_path}': {len(items)} items")
             return items
 
-        return []
+        print(f"✅ Found {len(items)} items in '{full_path}'")
+        shared_cache.set('folder', full_path, items, timeout=7200)
+        return items
+
+    def iter_folder_pages(self, path='', offset=0):
+        """Потоковое чтение папки: отдает элементы страницами по page_size"""
+        full_path = self._full_disk_path(path)
+
+        while True:
+            items, total = self._fetch_folder_page(full_path, offset)
+            if items is None:
+                self.failed_folders.add(full_path)
+                return
+            if not items:
+                return
+
+            yield items
+
+            offset += len(items)
+            if len(items) < self.page_size or (total is not None and offset >= total):
+                return
+
+    @staticmethod
+    def make_file_record(item):
+        """Элемент плоского списка файлов из ответа API"""
+        return {
+            'name': item['name'],
+            'path': item['path'],
+            'size': item.get('size', 0),
+            'modified': item.get('modified', ''),
+            'media_type': item.get('media_type', 'file'),
+            'md5': item.get('md5', ''),
+            'revision': item.get('revision'),
+            # Есть только у опубликованных файлов
+            'public_url': item.get('public_url'),
+            'public_key': item.get('public_key'),
+            'name_lower': item['name'].lower()
+        }
+
+    def get_flat_file_list(self, engine=None, on_files=None, use_cache=True):
+        """Оптимизированный параллельный сбор всех файлов.
 
-    def get_flat_file_list(self):
-        """Оптимизированный параллельный сбор всех файлов"""
-        cache_key = "all_files_optimized_v5"
-        cached_data = cache.get(cache_key)
+        on_files(files) вызывается для файлов каждой папки сразу после ее обхода,
+        чтобы следующие этапы могли начать работу до конца обхода.
+        use_cache=False не берет готовый список из кэша. Сам обход кэшированные
+        листинги папок не читает никогда: индекс строится по текущему состоянию Диска.
+        """
+        cache_key = make_key('all_files', self.root_folder)
+        cached_data = cache.get(cache_key) if use_cache else None
 
         if cached_data:
             print("✅ Using optimized file cache")
+            if on_files:
+                on_files(cached_data)
             return cached_data
 
-        print(f"🚀 HIGH-PERFORMANCE: Building file list with {self.max_workers} parallel workers...")
+        self.failed_folders = set()
+        self.crawled_folders = set()
+        engine = engine or self.crawler_engine
+        print(f"🚀 HIGH-PERFORMANCE: Building file list with {self.max_workers} parallel workers ({engine})...")
         start_time = time.time()
 
+        if engine == 'async':
+            all_files = AsyncDiskCrawler(self).run(on_files)
+        else:
+            all_files = self._crawl_with_threads(on_files)
+
+        total_time = time.time() - start_time
+        print(f"✅ HIGH-PERFORMANCE: Built file list with {len(all_files)} files in {total_time:.2f}s "
+              f"({len(all_files) / total_time:.1f} files/sec)")
+
+        if self.failed_folders:
+            # Неполный список не кэшируем: следующий вызов обойдет Диск заново
+            print(f"⚠️ Listing failed for {len(self.failed_folders)} folders")
+        else:
+            cache.set(cache_key, all_files, timeout=7200)
+        return all_files
+
+    def _crawl_with_threads(self, on_files=None):
+        """Обход папок через ThreadPoolExecutor"""
         all_files = []
         folders_to_process = [self.root_folder]
         processed_folders = set()
@@ -127,20 +305,13 @@ class YandexDiskClient:
                 with folder_lock:
                     processed_folders.add(folder_path)
 
-                items = self.get_folder_contents(folder_path)
+                items = self.get_folder_contents(folder_path, use_cache=False)
                 if not items:
                     continue
 
                 for item in items:
                     if item['type'] == 'file':
-                        batch_files.append({
-                            'name': item['name'],
-                            'path': item['path'],
-                            'size': item.get('size', 0),
-                            'modified': item.get('modified', ''),
-                            'media_type': item.get('media_type', 'file'),
-                            'name_lower': item['name'].lower()
-                        })
+                        batch_files.append(self.make_file_record(item))
                     elif item['type'] == 'dir':
                         new_folders.append(item['path'])
 
@@ -160,33 +331,40 @@ class YandexDiskClient:
                 for future in concurrent.futures.as_completed(future_to_batch):
                     try:
                         batch_files, new_folders = future.result()
-                        all_files.extend(batch_files)
-                        folders_to_process.extend(new_folders)
                     except Exception as e:
                         print(f"❌ Error processing folder batch: {e}")
+                        continue
 
-        total_time = time.time() - start_time
-        print(f"✅ HIGH-PERFORMANCE: Built file list with {len(all_files)} files in {total_time:.2f}s "
-              f"({len(all_files) / total_time:.1f} files/sec)")
+                    all_files.extend(batch_files)
+                    folders_to_process.extend(new_folders)
+                    self.crawled_folders.update(new_folders)
+                    # Ошибка получателя (упал следующий этап) прерывает обход
+                    if on_files and batch_files:
+                        on_files(batch_files)
 
-        cache.set(cache_key, all_files, timeout=7200)
         return all_files
 
-    def get_file_download_link(self, path):
-        """Многопоточное получение ссылок для скачивания"""
+    # Ссылку, которая истечет раньше чем через столько секунд, уже не отдаем
+    DOWNLOAD_LINK_MARGIN = 60
+
+    def _is_fresh(self, entry):
+        """Запись кэша (ссылка, истекает_в) еще пригодна для выдачи"""
+        return bool(entry) and entry[1] - time.time() > self.DOWNLOAD_LINK_MARGIN
+
+    def get_download_link_entry(self, path):
+        """Ссылка на скачивание и время ее истечения (unix time): (link, expires) или (None, None)"""
         # Проверяем кэш в памяти
         with self._cache_lock:
-            if path in self._download_cache:
-                return self._download_cache[path]
-
-        # Проверяем кэш в Django cache
-        cache_key = f"download_{hash(path)}"
-        cached_link = cache.get(cache_key)
+            entry = self._download_cache.get(path)
+        if self._is_fresh(entry):
+            return entry
 
-        if cached_link:
+        # Проверяем общий кэш процессов
+        entry = shared_cache.get('download', path)
+        if self._is_fresh(entry):
             with self._cache_lock:
-                self._download_cache[path] = cached_link
-            return cached_link
+                self._download_cache[path] = entry
+            return entry
 
         # Получаем новую ссылку
         url = f"{self.api_base_url}/download"
@@ -194,14 +372,18 @@ class YandexDiskClient:
 
         data = self._make_request(url, params)
         if data and 'href' in data:
-            download_link = data['href']
+            entry = (data['href'], time.time() + self.download_link_ttl)
             # Сохраняем в кэши
-            cache.set(cache_key, download_link, timeout=7200)
+            shared_cache.set('download', path, entry, timeout=self.download_link_ttl)
             with self._cache_lock:
-                self._download_cache[path] = download_link
-            return download_link
+                self._download_cache[path] = entry
+            return entry
 
-        return None
+        return None, None
+
+    def get_file_download_link(self, path):
+        """Многопоточное получение ссылок для скачивания"""
+        return self.get_download_link_entry(path)[0]
 
     def get_public_share_link(self, path):
         """Многопоточное получение публичных ссылок"""
@@ -210,9 +392,8 @@ class YandexDiskClient:
             if path in self._share_cache:
                 return self._share_cache[path]
 
-        # Проверяем кэш в Django cache
-        cache_key = f"public_{hash(path)}"
-        cached_link = cache.get(cache_key)
+        # Проверяем общий кэш процессов
+        cached_link = shared_cache.get('public', path)
 
         if cached_link:
             with self._cache_lock:
@@ -224,12 +405,21 @@ class YandexDiskClient:
 
         if public_link:
             # Сохраняем в кэши
-            cache.set(cache_key, public_link, timeout=86400)
+            shared_cache.set('public', path, public_link, timeout=86400)
             with self._cache_lock:
                 self._share_cache[path] = public_link
 
         return public_link
 
+    def remember_public_links(self, links):
+        """Публичные ссылки из листинга {path: public_url}: эти файлы уже опубликованы, publish не нужен"""
+        if not links:
+            return
+
+        with self._cache_lock:
+            self._share_cache.update(links)
+        shared_cache.set_many('public', links, timeout=86400)
+
     def _get_fresh_public_link(self, path):
         """Получает новую публичную ссылку с обработкой ошибок"""
         max_retries = 3
@@ -272,16 +462,32 @@ class YandexDiskClient:
 
         return None
 
-    def _process_single_file_links(self, file_path):
+    def prefetch_cached_links(self, paths):
+        """Загружает ссылки из общего кэша в память клиента одним запросом"""
+        cached = shared_cache.get_many([(namespace, path) for path in paths for namespace in ('download', 'public')])
+
+        with self._cache_lock:
+            for (namespace, path), value in cached.items():
+                if namespace == 'download':
+                    self._download_cache[path] = value
+                else:
+                    self._share_cache[path] = value
+
+        return cached
+
+    def _process_single_file_links(self, file_path, download_links=True):
         """Обрабатывает получение ссылок для одного файла"""
         path = file_path['path']
         try:
-            download_link = self.get_file_download_link(path)
+            download_link, download_link_expires = (
+                self.get_download_link_entry(path) if download_links else (None, None)
+            )
             public_link = self.get_public_share_link(path)
 
             return {
                 'path': path,
                 'download_link': download_link,
+                'download_link_expires': download_link_expires,
                 'public_link': public_link,
                 'success': True
             }
@@ -290,24 +496,32 @@ class YandexDiskClient:
             return {
                 'path': path,
                 'download_link': None,
+                'download_link_expires': None,
                 'public_link': None,
                 'success': False,
                 'error': str(e)
             }
 
-    def batch_get_links_hyper_optimized(self, file_paths):
-        """ГИПЕР-ОПТИМИЗИРОВАННОЕ многопоточное получение ссылок"""
+    def batch_get_links_hyper_optimized(self, file_paths, download_links=True):
+        """ГИПЕР-ОПТИМИЗИРОВАННОЕ многопоточное получение ссылок.
+
+        download_links=False - только публичные ссылки: ссылки на скачивание истекают
+        через YANDEX_DOWNLOAD_LINK_TTL и при ночном обновлении бесполезны.
+        """
         print(f"🚀 HYPER-OPTIMIZED: Processing {len(file_paths)} files with {self.max_workers} threads...")
         start_time = time.time()
 
         results = []
         total_files = len(file_paths)
 
+        # Один запрос к общему кэшу на весь батч вместо двух на каждый файл
+        self.prefetch_cached_links([fp['path'] for fp in file_paths])
+
         # Используем ThreadPoolExecutor для максимальной параллелизации
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             # Создаем futures для всех файлов
             future_to_path = {
-                executor.submit(self._process_single_file_links, fp): fp['path']
+                executor.submit(self._process_single_file_links, fp, download_links): fp['path']
                 for fp in file_paths
             }
 
@@ -333,6 +547,7 @@ class YandexDiskClient:
                     results.append({
                         'path': path,
                         'download_link': None,
+                        'download_link_expires': None,
                         'public_link': None,
                         'success': False,
                         'error': str(e)
@@ -349,50 +564,6 @@ class YandexDiskClient:
 
         return results
 
-    def mass_preload_all_links(self, all_files, batch_size=100):
-        """МАССОВАЯ предзагрузка всех ссылок с прогрессом"""
-        print(f"🚀 MASS PRELOAD: Starting mass links preloading for {len(all_files)} files...")
-        start_time = time.time()
-
-        total_files = len(all_files)
-        total_processed = 0
-        total_successful = 0
-
-        # Обрабатываем файлы батчами
-        for i in range(0, total_files, batch_size):
-            batch_files = all_files[i:i + batch_size]
-            file_paths = [{'path': file['path']} for file in batch_files]
-
-            # Получаем ссылки для батча
-            batch_results = self.batch_get_links_hyper_optimized(file_paths)
-
-            # Статистика батча
-            batch_successful = sum(1 for r in batch_results if r.get('success', False))
-            total_successful += batch_successful
-            total_processed += len(batch_results)
-
-            progress = min(i + batch_size, total_files)
-            elapsed = time.time() - start_time
-            overall_speed = total_processed / elapsed if elapsed > 0 else 0
-
-            print(f"📈 BATCH {i // batch_size + 1}: {batch_successful}/{len(batch_results)} successful | "
-                  f"Overall: {total_successful}/{total_processed} | "
-                  f"Speed: {overall_speed:.1f} files/sec")
-
-            # Динамическая пауза между батчами
-            if i + batch_size < total_files:
-                pause = max(0.5, 2.0 - (overall_speed / 10))  # Адаптивная пауза
-                time.sleep(pause)
-
-        total_time = time.time() - start_time
-        success_rate = (total_successful / total_files) * 100
-
-        print(f"🎉 MASS PRELOAD COMPLETED: {total_files} files in {total_time:.2f}s "
-              f"({total_files / total_time:.1f} files/sec)")
-        print(f"📊 SUCCESS RATE: {total_successful}/{total_files} ({success_rate:.1f}%)")
-
-        return total_successful
-
     def get_relative_path(self, full_path):
         """Получить относительный путь от корневой папки"""
         if full_path.startswith('disk:/'):
@@ -403,37 +574,9 @@ class YandexDiskClient:
             return relative
         return full_path
 
-    def build_search_index(self):
-        """Создает поисковый индекс для мгновенного поиска"""
-        cache_key = "search_index"
-        cached_index = cache.get(cache_key)
-
-        if cached_index:
-            return cached_index
-
-        print("🔍 Building search index...")
-        all_files = self.get_flat_file_list()
-
-        # Создаем простой индекс: слово -> список файлов
-        search_index = {}
-        for file_item in all_files:
-            file_name_lower = file_item['name'].lower()
-            words = re.findall(r'\b\w+\b', file_name_lower)
-
-            for word in words:
-                if len(word) > 2:  # Игнорируем короткие слова
-                    if word not in search_index:
-                        search_index[word] = []
-                    search_index[word].append(file_item)
-
-        cache.set(cache_key, search_index, timeout=3600)
-        print(f"✅ Search index built: {len(search_index)} words")
-        return search_index
-
     def get_folder_public_link(self, path):
         """Получить публичную ссылку для папки"""
-        cache_key = f"folder_public_{hash(path)}"
-        cached_link = cache.get(cache_key)
+        cached_link = shared_cache.get('folder_public', path)
 
         if cached_link:
             return cached_link
@@ -446,18 +589,74 @@ class YandexDiskClient:
         if not publish_data:
             return None
 
-        time.sleep(0.3)
-
         share_url = f"{self.api_base_url}"
         share_params = {
             'path': path,
             'fields': 'public_url'
         }
 
-        share_data = self._make_request(share_url, share_params)
-        if share_data and 'public_url' in share_data:
-            public_url = share_data['public_url']
-            cache.set(cache_key, public_url, timeout=86400)
-            return public_url
+        # Обычно ссылка есть сразу после publish; ждем, только если ее еще нет
+        for attempt in range(3):
+            share_data = self._make_request(share_url, share_params)
+            if share_data and 'public_url' in share_data:
+                public_url = share_data['public_url']
+                shared_cache.set('folder_public', path, public_url, timeout=86400)
+                return public_url
+            time.sleep(0.3 * (attempt + 1))
 
         return None
+
+    def get_share_folder(self, file_path, depth):
+        """Папка, которая публикуется целиком вместо файла: (путь папки, путь файла внутри нее).
+
+        depth - глубина от корневой папки: 0 - сам корень, 1 - папки первого уровня и т.д.
+        Для файлов выше этой глубины возвращает None: их публикуем по одному,
+        чтобы не открыть доступ ко всему корню.
+        """
+        # Корень может быть задан как X, /X или disk:/X - сравниваем нормализованные пути
+        root_prefix = normalize_path(self.root_folder).rstrip('/') + '/'
+        path = normalize_path(file_path)
+        if not path.startswith(root_prefix):
+            return None
+
+        relative_parts = path[len(root_prefix):].split('/')
+        if len(relative_parts) - 1 < depth:
+            return None
+
+        folder_path = normalize_path(root_prefix + '/'.join(relative_parts[:depth]))
+        return folder_path, '/'.join(relative_parts[depth:])
+
+    def batch_get_folder_links(self, file_paths, depth=1):
+        """Публичные ссылки файлов через опубликованные папки: по одной публикации на папку.
+
+        Ссылка файла - публичная ссылка папки плюс путь файла внутри нее,
+        поэтому число запросов к API растет с числом папок, а не файлов.
+        """
+        start_time = time.time()
+        targets = {fp['path']: self.get_share_folder(fp['path'], depth) for fp in file_paths}
+        folders = sorted({target[0] for target in targets.values() if target})
+        shallow_files = [{'path': path} for path, target in targets.items() if target is None]
+
+        results = []
+        if shallow_files:
+            results.extend(self.batch_get_links_hyper_optimized(shallow_files, download_links=False))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(folders)))) as executor:
+            folder_links = dict(zip(folders, executor.map(self.get_folder_public_link, folders)))
+
+        for path, target in targets.items():
+            if target is None:
+                continue
+            folder_path, inner_path = target
+            folder_link = folder_links.get(folder_path)
+            results.append({
+                'path': path,
+                'download_link': None,
+                'download_link_expires': None,
+                'public_link': f"{folder_link.rstrip('/')}/{urllib.parse.quote(inner_path)}" if folder_link else None,
+                'success': bool(folder_link),
+            })
+
+        print(f"📂 FOLDER LINKS: {len(results)} files via {len(folders)} folders "
+              f"and {len(shallow_files)} single files in {time.time() - start_time:.2f}s")
+        return results
@@ -1,12 +1,16 @@
 
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, redirect, render
 from django.core.cache import cache
+from django.http import Http404
 from django.db.models import Q
-from .models import FileIndex
+from .models import DirectoryIndex, FileIndex
 from .utils.yandex_disk import YandexDiskClient
+from .utils.search_engine import get_search_engine
+from .utils.file_links import LINK_FIELDS, get_download_link, register_click, resolve_links
+from .utils.shared_cache import shared_cache
+from .utils.cache_keys import make_key, normalize_path
+from .utils.index_generation import get_active_generation
 import time
-import re
-import difflib
 import concurrent.futures
 import threading
 
@@ -37,182 +41,56 @@ class FileView:
             return 'file'
 
 
-class SmartSearch:
-    """Класс для умного поиска как в Google"""
-
-    # Список стоп-слов (игнорируются при поиске)
-    STOP_WORDS = {
-        'для', 'на', 'в', 'с', 'по', 'из', 'у', 'о', 'от', 'до', 'за', 'к', 'со', 'во', 'не', 'ни',
-        'об', 'под', 'над', 'при', 'про', 'до', 'после', 'через', 'между', 'среди', 'вокруг',
-        'перед', 'возле', 'около', 'вдоль', 'поперек', 'сквозь', 'благодаря', 'вопреки', 'согласно',
-        'вследствие', 'ввиду', 'насчет', 'вроде', 'включая', 'исключая', 'не считая', 'спустя',
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
-        'из-за', 'из-под', 'по-над', 'по-под', 'и', 'или', 'да', 'но', 'зато', 'однако', 'же', 'ведь',
-        'что', 'как', 'когда', 'где', 'куда', 'откуда', 'почему', 'зачем', 'сколько', 'который',
-        'какой', 'чей', 'кто', 'что', 'это', 'то', 'все', 'всё', 'весь', 'каждый', 'любой', 'никакой',
-        'некий', 'некоторый', 'мой', 'твой', 'его', 'её', 'наш', 'ваш', 'их', 'свой', 'сам', 'самый',
-        'другой', 'иной', 'каковой', 'который', 'чей', 'сколько', 'столько', 'такой', 'эдакий',
-        'оный', 'сей', 'всякий', 'каждый', 'любой', 'никакой', 'некий', 'некоторый'
+def get_indexed_files(folder_path, file_paths):
+    """Строки индекса для файлов папки: {path: FileIndex}"""
+    fields = ('path', 'public_link')
+    indexed_files = {
+        file_index.path: file_index
+        for file_index in FileIndex.objects.filter(parent_path=normalize_path(folder_path)).only(*fields)
     }
 
-    @staticmethod
-    def normalize_text(text):
-        """Нормализует текст для поиска"""
-        if not text:
-            return ""
-
-        # Приводим к нижнему регистру и убираем лишние пробелы
-        text = str(text).lower().strip()
-
-        # Убираем пунктуацию кроме дефисов и точек в расширениях
-        text = re.sub(r'[^\w\s\-\.]', ' ', text)
-
-        # Заменяем множественные пробелы на один
-        text = re.sub(r'\s+', ' ', text)
-
-        return text
-
-    @staticmethod
-    def filter_stop_words(words):
-        """Фильтрует стоп-слова из списка слов"""
-        return [word for word in words if word not in SmartSearch.STOP_WORDS and len(word) > 2]
-
-    @staticmethod
-    def get_word_variations(word):
-        """Генерирует варианты слова для поиска"""
-        if len(word) <= 3:
-            return [word]
-
-        variations = set()
-        variations.add(word)
-
-        # Базовые формы для русского языка
-        if word.endswith('ь'):
-            variations.add(word[:-1])  # дверь -> двер
-        if word.endswith('и'):
-            variations.add(word[:-1] + 'а')  # двери -> дверь
-            variations.add(word[:-1] + 'ь')  # двери -> дверь
-        if word.endswith('ой'):
-            variations.add(word[:-2] + 'ая')  # дверной -> дверная
-        if word.endswith('ая'):
-            variations.add(word[:-2] + 'ой')  # дверная -> дверной
-        if word.endswith('ый'):
-            variations.add(word[:-2] + 'ая')  # дверный -> дверная
-        if word.endswith('ом'):
-            variations.add(word[:-2])  # двером -> дверь
-        if word.endswith('ам'):
-            variations.add(word[:-2])  # дверям -> дверь
-
-        # Добавляем основу
-        base = word
-        if len(word) > 4:
-            if word.endswith(('ой', 'ая', 'ое', 'ые', 'ий', 'ый')):
-                base = word[:-2]
-            elif word.endswith(('ь', 'и', 'ы', 'а', 'я', 'о', 'е', 'у', 'ю')):
-                base = word[:-1]
-
-            if base and len(base) > 3:
-                variations.add(base)
-
-        return list(variations)
-
-    @staticmethod
-    def calculate_similarity(word1, word2):
-        """Вычисляет схожесть между двумя словами"""
-        if not word1 or not word2:
-            return 0
-
-        # Полное совпадение
-        if word1 == word2:
-            return 1.0
+    # Индекс, построенный до появления parent_path, добираем по путям
+    missing = [file_path for file_path in file_paths if file_path not in indexed_files]
+    for i in range(0, len(missing), 500):
+        for file_index in FileIndex.objects.filter(path__in=missing[i:i + 500]).only(*fields):
+            indexed_files[file_index.path] = file_index
 
-        # Получаем варианты слов
-        variations1 = SmartSearch.get_word_variations(word1)
-        variations2 = SmartSearch.get_word_variations(word2)
+    return indexed_files
 
-        # Проверяем совпадение вариантов
-        for var1 in variations1:
-            for var2 in variations2:
-                if var1 == var2:
-                    return 0.95
 
-        # Проверяем вхождение одной основы в другую
-        for var1 in variations1:
-            for var2 in variations2:
-                if var1 in var2 or var2 in var1:
-                    if len(var1) >= 3 and len(var2) >= 3:
-                        return 0.8
+def get_indexed_navigation(yandex_client, folder_path):
+    """Папки и файлы из локального индекса или None, если папки в индексе нет"""
+    folder_path = normalize_path(folder_path)
+    if not DirectoryIndex.objects.filter(path=folder_path).exists():
+        return None
 
-        # Используем SequenceMatcher для похожих слов
-        similarity = difflib.SequenceMatcher(None, word1, word2).ratio()
-
-        if similarity > 0.7:
-            return similarity
-
-        return 0
-
-    @staticmethod
-    def smart_search(query, file_name):
-        """Умный поиск как в Google"""
-        if not query or not file_name:
-            return 0
-
-        # Нормализуем текст
-        query_norm = SmartSearch.normalize_text(query)
-        file_name_norm = SmartSearch.normalize_text(file_name)
-
-        # Если запрос полностью содержится в названии - максимальный рейтинг
-        if query_norm in file_name_norm:
-            return 100
-
-        # Разбиваем на слова и ФИЛЬТРУЕМ СТОП-СЛОВА
-        query_words = SmartSearch.filter_stop_words(query_norm.split())
-        file_words = [w for w in file_name_norm.split() if len(w) > 2]
-
-        # Если после фильтрации не осталось значимых слов
-        if not query_words:
-            return 0
-
-        total_score = 0
-        matched_words = 0
-
-        for q_word in query_words:
-            word_found = False
-            word_score = 0
-
-            for f_word in file_words:
-                similarity = SmartSearch.calculate_similarity(q_word, f_word)
-
-                if similarity > 0.9:
-                    word_score = max(word_score, 1.0)
-                    word_found = True
-                    break  # Нашли идеальное совпадение
-                elif similarity > 0.8:
-                    word_score = max(word_score, 0.8)
-                    word_found = True
-                elif similarity > 0.7:
-                    word_score = max(word_score, 0.6)
-                    word_found = True
-                elif similarity > 0.6:
-                    word_score = max(word_score, 0.4)
-                    word_found = True
-
-            if word_found:
-                total_score += word_score
-                matched_words += 1
-
-        # Если не нашли ни одного похожего слова - возвращаем 0
-        if matched_words == 0:
-            return 0
-
-        # Вычисляем общий рейтинг релевантности
-        base_score = (total_score / len(query_words)) * 80
+    folders = [
+        {
+            'name': directory.name,
+            'path': yandex_client.get_relative_path(directory.path),
+            'modified': directory.modified[:10],
+            'size': directory.total_size,
+            'files_count': directory.total_files,
+        }
+        for directory in DirectoryIndex.objects.filter(parent_path=folder_path).order_by('name')
+    ]
 
-        # Бонус за совпадение всех слов запроса
-        if matched_words == len(query_words):
-            base_score += 20
+    files = [
+        {
+            'name': file_index.name,
+            'size': file_index.size,
+            'modified': file_index.modified[:10],
+            'path': file_index.path,
+            'media_type': file_index.media_type,
+            'file_type': file_index.file_type,
+            # Скачивание идет через /d/<id>: подписанная ссылка обновляется при клике
+            'id': file_index.id,
+            'public_link': file_index.public_link,
+        }
+        for file_index in FileIndex.objects.filter(parent_path=folder_path).order_by('name')
+    ]
 
-        return min(100, base_score)
+    return folders, files
 
 
 def index(request, path=''):
@@ -225,10 +103,15 @@ def index(request, path=''):
 
     # Кэшируем навигацию по текущей папке
     current_path = f"{yandex_client.root_folder}/{path}" if path else yandex_client.root_folder
-    cache_key = f"nav_{hash(current_path)}"
-    cached_navigation = cache.get(cache_key)
-
-    if cached_navigation:
+    # Навигация из API кэшируется в рамках поколения индекса
+    cache_key = make_key('nav', get_active_generation(), normalize_path(current_path))
+    indexed_navigation = get_indexed_navigation(yandex_client, current_path)
+    cached_navigation = None if indexed_navigation is not None else cache.get(cache_key)
+
+    if indexed_navigation is not None:
+        print(f"⚡ Using local index for: '{current_path}'")
+        folders, files = indexed_navigation
+    elif cached_navigation:
         print(f"✅ Using cached navigation for: '{current_path}'")
         folders, files = cached_navigation
     else:
@@ -241,6 +124,18 @@ def index(request, path=''):
         files = []
 
         if folder_contents:
+            # Ссылки из общего кэша для всех файлов папки - одним запросом
+            cached_links = shared_cache.get_many([
+                (namespace, item['path'])
+                for item in folder_contents if item['type'] == 'file'
+                for namespace in ('download', 'public')
+            ])
+
+            # Строки индекса для всех файлов папки - одним запросом вместо запроса на файл
+            indexed_files = get_indexed_files(
+                current_path, [item['path'] for item in folder_contents if item['type'] == 'file']
+            )
+
             for item in folder_contents:
                 if item['type'] == 'dir':
                     rel_path = yandex_client.get_relative_path(item['path'])
@@ -251,7 +146,7 @@ def index(request, path=''):
                     })
                 elif item['type'] == 'file':
                     # Получаем ссылки из базы данных (быстро!)
-                    file_index = FileIndex.objects.filter(path=item['path']).first()
+                    file_index = indexed_files.get(item['path'])
 
                     file_data = {
                         'name': item['name'],
@@ -263,8 +158,16 @@ def index(request, path=''):
                     }
 
                     if file_index:
-                        file_data['download_link'] = file_index.download_link
+                        file_data['id'] = file_index.id
                         file_data['public_link'] = file_index.public_link
+                    else:
+                        # Файла нет в индексе - отдаем ссылку из кэша, только пока она действует
+                        link, expires = cached_links.get(('download', item['path'])) or (None, 0)
+                        if expires - time.time() > yandex_client.DOWNLOAD_LINK_MARGIN:
+                            file_data['download_link'] = link
+
+                    if not file_data.get('public_link'):
+                        file_data['public_link'] = cached_links.get(('public', item['path']))
 
                     files.append(file_data)
 
@@ -311,61 +214,60 @@ def search(request):
         }
         return render(request, 'explorer/search_results.html', context)
 
-    start_time = time.time()
-
-    # Получаем ВСЕ файлы из базы
-    all_files_db = FileIndex.objects.all()
-
-    print(f"🔍 SMART SEARCH: '{query}' в {all_files_db.count()} файлах...")
-
-    # Применяем умный поиск ко всем файлам
-    scored_results = []
-
-    for file_item in all_files_db:
-        # Вычисляем релевантность с помощью умного поиска
-        relevance = SmartSearch.smart_search(query, file_item.name)
-
-        if relevance > 5:  # НИЗКИЙ порог чтобы найти больше файлов
-            yandex_client = YandexDiskClient()
-            relative_path = yandex_client.get_relative_path(file_item.path)
-            path_parts = relative_path.split('/')
-            display_path = ' / '.join(path_parts[:-1]) if len(path_parts) > 1 else 'Корневая папка'
-
-            scored_results.append({
-                'name': file_item.name,
-                'path': display_path,
-                'full_path': file_item.path,
-                'size': file_item.size,
-                'modified': file_item.modified,
-                'download_link': file_item.download_link,
-                'public_link': file_item.public_link,
-                'media_type': file_item.media_type,
-                'file_type': file_item.file_type,
-                'relevance': relevance
-            })
-
-    # Сортируем по релевантности (убывание)
-    scored_results.sort(key=lambda x: x['relevance'], reverse=True)
-
-    # Ограничиваем количество результатов для производительности
-    final_results = scored_results[:100]
-
-    search_time = round(time.time() - start_time, 2)
+    # Общий для сайта и API поиск; НИЗКИЙ порог чтобы найти больше файлов
+    search_result = get_search_engine().search(query, threshold=5, limit=100)
+    final_results = search_result['results']
+    timings = search_result['timings']
+    search_time = round(timings['total'], 2)
 
+    if timings['cache_hit']:
+        stages = f"из кэша за {timings['cache'] * 1000:.1f} мс"
+    else:
+        stages = f"кандидаты {timings['candidates'] * 1000:.1f} мс, оценка {timings['scoring'] * 1000:.1f} мс"
     print(f"🚀 SMART SEARCH: Найдено {len(final_results)} файлов за {search_time}s "
-          f"(макс. релевантность: {max(r['relevance'] for r in final_results) if final_results else 0}%)")
+          f"({stages}, "
+          f"результаты {timings['serialization'] * 1000:.1f} мс; "
+          f"макс. релевантность: {max(r['relevance'] for r in final_results) if final_results else 0}%)")
 
     context = {
         'query': query,
         'results': final_results,
         'results_count': len(final_results),
         'view': FileView(),
-        'search_time': search_time
+        'search_time': search_time,
+        'cache_hit': timings['cache_hit'],
     }
 
     return render(request, 'explorer/search_results.html', context)
 
 
+def file_link(request, file_id, kind):
+    """Переход по ссылке файла из поиска: недостающая или истекшая ссылка получается в момент клика"""
+    if kind not in LINK_FIELDS:
+        raise Http404('Неизвестный вид ссылки')
+
+    if kind == 'download':
+        return download(request, file_id)
+
+    file_index = get_object_or_404(FileIndex, pk=file_id)
+    link = resolve_links(file_index, fields=(LINK_FIELDS[kind],))[LINK_FIELDS[kind]]
+    if not link:
+        raise Http404('Не удалось получить ссылку на файл')
+
+    register_click(file_id)
+    return redirect(link)
+
+
+def download(request, file_id):
+    """Скачивание по id: подписанная ссылка получается или обновляется в момент клика, ответ - 302"""
+    link = get_download_link(file_id)
+    if not link:
+        raise Http404('Файл не найден или ссылка недоступна')
+
+    register_click(file_id)
+    return redirect(link)
+
+
 # Глобальная переменная для хранения автоматического содержания
 _AUTO_CONTENT_CACHE = None
 
@@ -472,6 +374,47 @@ class ContentBuilder:
             print(f"Error building folder tree for {path}: {e}")
             return []
 
+    def build_folder_tree_from_index(self, path):
+        """Строит то же дерево папок по локальному индексу: один запрос к базе вместо обхода API"""
+        root = normalize_path(path)
+        directories = list(DirectoryIndex.objects.filter(path__startswith=root + '/').order_by('name'))
+        if not directories:
+            return []
+
+        children_by_parent = {}
+        for directory in directories:
+            children_by_parent.setdefault(directory.parent_path, []).append(directory)
+
+        # Публичные ссылки папок по-прежнему берем из API (с кэшем), но всех уровней сразу
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            link_futures = {
+                executor.submit(self.get_folder_public_link_threadsafe, directory.path): directory.path
+                for directory in directories
+            }
+
+            folder_links = {}
+            for future in concurrent.futures.as_completed(link_futures):
+                folder_path = link_futures[future]
+                try:
+                    folder_links[folder_path] = future.result()
+                except Exception as e:
+                    print(f"Error getting link for {folder_path}: {e}")
+                    folder_links[folder_path] = None
+
+        def build_level(parent_path):
+            return [
+                {
+                    'name': directory.name,
+                    'public_link': folder_links.get(directory.path),
+                    'path': directory.path,
+                    'type': 'folder',
+                    'children': build_level(directory.path)
+                }
+                for directory in children_by_parent.get(parent_path, [])
+            ]
+
+        return build_level(root)
+
     def convert_tree_to_accordion_format(self, folder_tree):
         """Конвертирует древовидную структуру в формат для аккордеона"""
         content_structure = []
@@ -598,8 +541,10 @@ class ContentBuilder:
         print(f"🚀 MULTITHREADED TREE: Building folder tree structure with {self.max_workers} threads...")
         start_time = time.time()
 
-        # Строим полное древовидное содержание
-        folder_tree = self.build_folder_tree_parallel(self.yandex_client.root_folder)
+        # Строим полное древовидное содержание: из индекса папок, если он уже построен
+        folder_tree = self.build_folder_tree_from_index(self.yandex_client.root_folder)
+        if not folder_tree:
+            folder_tree = self.build_folder_tree_parallel(self.yandex_client.root_folder)
 
         # Конвертируем в формат для твоего аккордеона
         accordion_structure = self.convert_tree_to_accordion_format(folder_tree)
@@ -618,15 +563,16 @@ def get_auto_content_structure():
     """Автоматически генерирует структуру содержания в формате для твоего шаблона"""
     global _AUTO_CONTENT_CACHE
 
-    # Используем глобальный кэш чтобы содержание сохранялось до перезапуска приложения
-    if _AUTO_CONTENT_CACHE is not None:
-        return _AUTO_CONTENT_CACHE
+    # Глобальный кэш живет до перезапуска приложения или до нового поколения индекса
+    generation = get_active_generation()
+    if _AUTO_CONTENT_CACHE is not None and _AUTO_CONTENT_CACHE[0] == generation:
+        return _AUTO_CONTENT_CACHE[1]
 
     # Строим древовидное содержание многопоточно
     content_builder = ContentBuilder(max_workers=15)
-    _AUTO_CONTENT_CACHE = content_builder.build_content_structure()
+    _AUTO_CONTENT_CACHE = (generation, content_builder.build_content_structure())
 
-    return _AUTO_CONTENT_CACHE
+    return _AUTO_CONTENT_CACHE[1]
 
 
 def content_page(request):
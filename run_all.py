@@ -27,7 +27,7 @@ class SystemManager:
             # Используем вашу оптимальную команду
             update_process = subprocess.Popen([
                 sys.executable, 'manage.py', 'update_file_index',
-                '--workers=32', '--batch-size=200'
+                '--workers=32', '--batch-size=200', '--incremental'
             ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
 
             # Читаем вывод в реальном времени
@@ -54,7 +54,7 @@ class SystemManager:
         schedule.every().day.at("03:00").do(lambda: asyncio.create_task(self.update_database()))
 
         print("⏰ Планировщик запущен - ежедневное обновление БД в 03:00")
-        print("⚡ Параметры обновления: --workers=32 --batch-size=200")
+        print("⚡ Параметры обновления: --workers=32 --batch-size=200 --incremental")
 
         while self.running:
             schedule.run_pending()
@@ -108,6 +108,7 @@ class SystemManager:
         print("⚡ Оптимальные параметры обновления БД:")
         print("   • --workers=32")
         print("   • --batch-size=200")
+        print("   • --incremental")
         print("=" * 50)
 
         # Запускаем планировщик обновлений БД
@@ -90,6 +90,49 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 YANDEX_MAX_WORKERS = 15
 REQUEST_TIMEOUT = 25
 
+# Обход Диска: 'async' - aiohttp с token bucket, 'threads' - ThreadPoolExecutor
+YANDEX_CRAWLER_ENGINE = 'async'
+YANDEX_RATE_LIMIT = 50  # запросов в секунду
+YANDEX_MAX_RETRIES = 5  # повторы на 429/5xx с учетом Retry-After
+
+# Ссылки на скачивание подписаны и живут недолго: время жизни в секундах.
+# Получаются при клике по /d/<id>; последние ссылки держит горячий кэш процесса
+YANDEX_DOWNLOAD_LINK_TTL = 3600
+DOWNLOAD_HOT_CACHE_SIZE = 512
+
+# Отбор кандидатов поиска: 'memory' - индекс в памяти процесса,
+# 'fts' - таблица SQLite FTS5 (строится update_file_index, памяти почти не требует)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'memory')
+
+# Параллельная оценка больших выборок кандидатов в процессах (нужен fork, 0 - выключено)
+SEARCH_SCORING_WORKERS = int(os.getenv('SEARCH_SCORING_WORKERS', 0))
+SEARCH_PARALLEL_MIN_CANDIDATES = 20000
+
+# Кэш готовых рейтингов поиска в процессе: записей и время жизни в секундах.
+# Ключ содержит поколение индекса, поэтому после обновления старые записи не используются
+SEARCH_RESULT_CACHE_SIZE = 1024
+SEARCH_RESULT_CACHE_TTL = 600
+
+# Общий кэш папок и ссылок для веб-сервера, update_file_index и бота:
+# 'sqlite' - отдельный SQLite-файл, 'file' - FileBasedCache, 'locmem' - кэш процесса
+YANDEX_SHARED_CACHE = os.getenv('YANDEX_SHARED_CACHE', 'sqlite')
+YANDEX_SHARED_CACHE_ALIAS = 'shared'
+
+SHARED_CACHE_BACKENDS = {
+    'sqlite': {
+        'BACKEND': 'explorer.utils.shared_cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yadisk-shared-cache',
+    },
+}
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -99,7 +142,15 @@ CACHES = {
             'MAX_ENTRIES': 10000,
             'CULL_FREQUENCY': 2,
         }
-    }
+    },
+    YANDEX_SHARED_CACHE_ALIAS: {
+        **SHARED_CACHE_BACKENDS[YANDEX_SHARED_CACHE],
+        'TIMEOUT': 7200,
+        'OPTIONS': {
+            'MAX_ENTRIES': 500000,
+            'CULL_FREQUENCY': 4,
+        }
+    },
 }
 
 YANDEX_DISK_CONFIG = {